@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: destination catalog load time and lookup latency.
+
+Builds a synthetic catalog (default 50,000 places) in a temp file and times
+exact, "City, Country", prefix and misspelled lookups, uncached and cached.
+
+Run from backend/:
+    python benchmarks/bench_catalog.py --places 50000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import DestinationCatalog  # noqa: E402
+
+
+def synthetic_name(rng: random.Random) -> str:
+    syllables = ["ka", "lo", "ri", "ma", "ten", "vos", "bar", "qui", "del", "sun", "mor", "ala", "zen", "pra"]
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def build(path: str, n: int, rng: random.Random):
+    names = []
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            name = f"{synthetic_name(rng)} {rng.choice(string.ascii_uppercase)}{i}"
+            country = f"Country {i % 200}"
+            names.append((name, country))
+            f.write(json.dumps({
+                "name": name,
+                "country": country,
+                "tags": ["culture"],
+                "attractions": [f"{name} Museum", f"{name} Old Town"],
+                "restaurants": [f"{name} Bistro"],
+                "weather": "Mild",
+                "description": "Synthetic place.",
+            }) + "\n")
+    return names
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--places", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "places.jsonl")
+        names = build(path, args.places, rng)
+
+        catalog = DestinationCatalog(path)
+        started = time.perf_counter()
+        catalog.warm()
+        print(f"{args.places} places loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        sample = rng.sample(names, min(args.queries, len(names)))
+        cases = {
+            "exact": [n.lower() for n, _ in sample],
+            "name, country": [f"{n}, {c}" for n, c in sample],
+            "prefix": [n[:-1] for n, _ in sample],
+            "misspelled": [misspell(n, rng) for n, _ in sample],
+        }
+        for label, queries in cases.items():
+            hits = sum(1 for q in queries if catalog._resolve(q) is not None)
+            secs = timeit.timeit(lambda: [catalog._resolve(q) for q in queries], number=1) / len(queries)
+            print(f"    {label:<14} uncached {secs * 1e6:9.1f} us   hit rate {hits / len(queries):.0%}")
+
+        queries = cases["misspelled"]
+        [catalog.lookup(q) for q in queries]
+        secs = timeit.timeit(lambda: [catalog.lookup(q) for q in queries], number=5) / (5 * len(queries))
+        print(f"    {'cached':<14}          {secs * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: JsonObjectScanner vs. the original per-character scanner.
+
+Run from backend/:
+    python benchmarks/bench_json_extract.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import JsonObjectScanner  # noqa: E402
+
+
+def legacy_scan(text: str) -> str:
+    """The balanced-brace loop _extract_json_object used before JsonObjectScanner."""
+    start = text.find("{")
+    depth = 0
+    in_str = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def scanner_scan(text: str) -> str:
+    return JsonObjectScanner().feed(text)
+
+
+def streamed_scan(text: str, chunk_size: int = 4) -> str:
+    scanner = JsonObjectScanner()
+    for i in range(0, len(text), chunk_size):
+        if scanner.feed(text[i:i + chunk_size]) is not None:
+            break
+    return scanner.result
+
+
+def messy_output(days: int) -> str:
+    """Commentary, escapes and braces inside strings, then trailing junk."""
+    activities = [
+        {
+            "time": slot,
+            "title": f"Visit \"{slot}\" spot #{i} {{not a brace}}",
+            "description": "Walk the C:\\\\old\\\\town and try the {local} dish. " * 6,
+            "cost": 10 * i,
+        }
+        for i, slot in enumerate(["Morning", "Afternoon", "Evening"] * days)
+    ]
+    obj = {"day": 1, "theme": "Food & Local Markets", "activities": activities, "notes": "Go early."}
+    return "Sure! Here is your plan:\n```json\n" + json.dumps(obj, indent=2) + "\n```\nHope this helps { !"
+
+
+def main():
+    for days in (1, 10, 100):
+        text = messy_output(days)
+        expected = legacy_scan(text)
+        assert scanner_scan(text) == expected
+        assert streamed_scan(text) == expected
+
+        number = max(1, 2000 // days)
+        print(f"{len(text):>8} chars")
+        for name, fn in (("legacy", legacy_scan), ("scanner", scanner_scan), ("streamed/4", streamed_scan)):
+            secs = min(timeit.repeat(lambda: fn(text), number=number, repeat=5)) / number
+            print(f"    {name:<11} {secs * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Stand-in for Ollama's /api/generate, for offline load tests.
+
+Replays canned JSON outputs with configurable prefill and per-token latency
+and a cap on parallel generations (like OLLAMA_NUM_PARALLEL). A fraction of
+first attempts can be answered with truncated JSON, which exercises the
+retry path in generate_itinerary_with_ollama and the /suggest_* error path.
+
+Run from backend/:
+    python benchmarks/fake_ollama.py --port 11434 --token-latency 0.01 --concurrency 2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DEFAULT_OUTPUTS = {
+    "day": {
+        "day": 0,
+        "theme": "Stand-in theme",
+        "estimated_cost": 150,
+        "activities": [
+            {"time": "Morning", "title": "Stand-in morning visit", "description": "Canned description.", "cost": 40},
+            {"time": "Afternoon", "title": "Stand-in afternoon walk", "description": "Canned description.", "cost": 50},
+            {"time": "Evening", "title": "Stand-in evening dinner", "description": "Canned description.", "cost": 30},
+        ],
+        "notes": "Canned local tip.",
+    },
+    "destinations": {
+        "suggestions": [
+            {"country": "Portugal", "reason": "Canned reason.", "flag": "🇵🇹"},
+            {"country": "Japan", "reason": "Canned reason.", "flag": "🇯🇵"},
+            {"country": "Peru", "reason": "Canned reason.", "flag": "🇵🇪"},
+            {"country": "Kenya", "reason": "Canned reason.", "flag": "🇰🇪"},
+            {"country": "Iceland", "reason": "Canned reason.", "flag": "🇮🇸"},
+        ]
+    },
+    "districts": {
+        "suggestions": [
+            {"name": "Old Town", "description": "Canned description.", "image_keyword": "old town"},
+            {"name": "Harbour", "description": "Canned description.", "image_keyword": "harbour"},
+            {"name": "Hills", "description": "Canned description.", "image_keyword": "hills"},
+            {"name": "Market Quarter", "description": "Canned description.", "image_keyword": "market"},
+        ]
+    },
+}
+
+_DAY_RE = re.compile(r"Create ONLY Day (\d+)")
+_BATCH_RE = re.compile(r"Create ONLY Days (\d+)-(\d+)")
+
+
+def _tokens(text: str, size: int = 4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeOllama:
+    def __init__(self, outputs: dict, token_latency: float, prefill_latency: float,
+                 concurrency: int, malformed_rate: float):
+        self.outputs = outputs
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.malformed_rate = malformed_rate
+        self.slots = asyncio.Semaphore(max(1, concurrency))
+        self.stats = {"requests": 0, "malformed": 0, "active": 0, "aborted": 0}
+
+    def _malformed(self, prompt: str, seed: int) -> bool:
+        # Only first attempts (seed < 2000) go wrong, so the retry succeeds
+        if seed >= 2000 or not self.malformed_rate:
+            return False
+        digest = hashlib.sha256(f"{seed}:{prompt}".encode("utf-8")).digest()
+        return digest[0] / 256 < self.malformed_rate
+
+    def render(self, prompt: str, seed: int) -> str:
+        m = _DAY_RE.search(prompt)
+        batch = _BATCH_RE.search(prompt)
+        if batch:
+            first, last = int(batch.group(1)), int(batch.group(2))
+            obj = {"days": [dict(self.outputs["day"], day=d) for d in range(first, last + 1)]}
+        elif m:
+            obj = dict(self.outputs["day"], day=int(m.group(1)))
+        elif "districts" in prompt:
+            obj = self.outputs["districts"]
+        else:
+            obj = self.outputs["destinations"]
+
+        text = json.dumps(obj, ensure_ascii=False)
+        if self._malformed(prompt, seed):
+            self.stats["malformed"] += 1
+            return "Here is your plan: " + text[: len(text) // 2]
+        return text
+
+    def stats_fields(self, prompt: str, context: list, tokens: int, started: float) -> dict:
+        # Only the new prompt is evaluated; a passed-in context is already prefilled
+        prompt_tokens = max(1, len(prompt) // 4)
+        return {
+            "done": True,
+            "context": (context or []) + list(range(prompt_tokens + tokens)),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.prefill_latency * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(tokens * self.token_latency * 1e9),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+        }
+
+
+def create_app(fake: FakeOllama) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "phi3:mini"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        options = body.get("options") or {}
+        context = body.get("context") or []
+        text = fake.render(prompt, options.get("seed", 0))
+        # Honour num_predict like the real server (e.g. 1-token prefill calls)
+        pieces = _tokens(text)[: options.get("num_predict") or None]
+        fake.stats["requests"] += 1
+
+        if not body.get("stream", True):
+            started = time.perf_counter()
+            async with fake.slots:
+                fake.stats["active"] += 1
+                try:
+                    await asyncio.sleep(fake.prefill_latency + fake.token_latency * len(pieces))
+                finally:
+                    fake.stats["active"] -= 1
+            return {"model": body.get("model"), "response": "".join(pieces), **fake.stats_fields(prompt, context, len(pieces), started)}
+
+        async def stream():
+            started = time.perf_counter()
+            async with fake.slots:
+                fake.stats["active"] += 1
+                try:
+                    await asyncio.sleep(fake.prefill_latency)
+                    for piece in pieces:
+                        await asyncio.sleep(fake.token_latency)
+                        yield json.dumps({"model": body.get("model"), "response": piece, "done": False}) + "\n"
+                    yield json.dumps({"model": body.get("model"), "response": "",
+                                      **fake.stats_fields(prompt, context, len(pieces), started)}) + "\n"
+                except asyncio.CancelledError:
+                    fake.stats["aborted"] += 1
+                    raise
+                finally:
+                    fake.stats["active"] -= 1
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds per streamed token")
+    parser.add_argument("--prefill-latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel generations, others wait")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of first attempts returning broken JSON")
+    parser.add_argument("--outputs", help="JSON file overriding the canned 'day', 'destinations' and 'districts' outputs")
+    args = parser.parse_args()
+
+    outputs = dict(DEFAULT_OUTPUTS)
+    if args.outputs:
+        with open(args.outputs, encoding="utf-8") as f:
+            outputs.update(json.load(f))
+
+    import uvicorn
+
+    fake = FakeOllama(outputs, args.token_latency, args.prefill_latency, args.concurrency, args.malformed_rate)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Open-loop load generator for the travel planner API.
+
+Fires requests at a fixed rate (regardless of how fast responses come back)
+against /plan, /suggest_destinations and /suggest_districts and reports
+p50/p95/p99 latency, throughput and error rates per endpoint.
+
+Run from backend/, with the API pointed at benchmarks/fake_ollama.py:
+    python benchmarks/loadgen.py --rps 5 --duration 30 --mix plan=1,destinations=3,districts=3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+INTERESTS = ["beaches", "hiking", "food", "museums", "nightlife", "skiing", "wine", "architecture"]
+COUNTRIES = ["Japan", "Italy", "Peru", "Portugal", "Kenya", "Iceland"]
+DESTINATIONS = ["Paris", "Tokyo", "Lisbon", "Cusco", "Nairobi", "Reykjavik"]
+
+
+def make_request(kind: str, rng: random.Random, unique: bool, days: int):
+    tag = f" #{rng.randrange(10**9)}" if unique else ""
+    if kind == "plan":
+        return "/plan", {
+            "destination": rng.choice(DESTINATIONS) + tag,
+            "days": days,
+            "budget": rng.choice(["budget", "midrange", "luxury"]),
+            "interests": [rng.choice(INTERESTS)],
+            "travelers": 2,
+        }
+    if kind == "destinations":
+        return "/suggest_destinations", {"interest": rng.choice(INTERESTS) + tag}
+    return "/suggest_districts", {"country": rng.choice(COUNTRIES), "interest": rng.choice(INTERESTS) + tag}
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+async def run(args) -> dict:
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    kinds, weights = list(mix), list(mix.values())
+
+    rng = random.Random(args.seed)
+    results = {kind: [] for kind in kinds}  # kind -> [(latency, ok, status)]
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+
+        async def one(kind: str):
+            path, body = make_request(kind, rng, args.unique, args.days)
+            started = time.perf_counter()
+            try:
+                r = await client.post(path, json=body)
+                status = r.status_code
+                ok = status == 200 and r.json().get("success", False)
+            except httpx.HTTPError as e:
+                status, ok = type(e).__name__, False
+            results[kind].append((time.perf_counter() - started, ok, status))
+
+        tasks = []
+        interval = 1.0 / args.rps
+        started = time.perf_counter()
+        n = 0
+        while time.perf_counter() - started < args.duration:
+            kind = rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(one(kind)))
+            n += 1
+            # Schedule against the start time so slow responses don't lower the rate
+            await asyncio.sleep(max(0.0, started + n * interval - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {"elapsed_s": round(elapsed, 3), "target_rps": args.rps, "endpoints": {}}
+    for kind, rows in results.items():
+        latencies = sorted(lat for lat, _, _ in rows)
+        errors = sum(1 for _, ok, _ in rows if not ok)
+        statuses = {}
+        for _, _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report["endpoints"][kind] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 3) if elapsed else 0.0,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "statuses": statuses,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"elapsed {report['elapsed_s']}s, target {report['target_rps']} rps")
+    print(f"{'endpoint':<14}{'reqs':>6}{'rps':>8}{'err%':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for kind, row in report["endpoints"].items():
+        print(
+            f"{kind:<14}{row['requests']:>6}{row['throughput_rps']:>8.2f}{row['error_rate'] * 100:>7.1f}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}  {row['statuses']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep sending")
+    parser.add_argument("--mix", default="plan=1,destinations=3,districts=3", help="endpoint weights")
+    parser.add_argument("--days", type=int, default=3, help="days per /plan request")
+    parser.add_argument("--unique", action="store_true", help="make every payload unique (defeats caching)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
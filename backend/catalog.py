@@ -0,0 +1,269 @@
+"""
+Destination catalog with exact, prefix and fuzzy (trigram) lookup.
+
+Places are read from a JSON-lines file the first time they are needed, so
+startup stays fast. Names, aliases and "name country" forms are normalized
+(case, accents, punctuation) into one key table with:
+  - a dict for exact matches,
+  - a sorted key list searched with bisect for prefixes,
+  - a trigram -> key-id index (names and aliases only) for misspellings.
+Resolved queries are memoized, so repeat lookups are a dict hit.
+"""
+import bisect
+import heapq
+import json
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+DESTINATION_CATALOG_PATH = os.getenv(
+    "DESTINATION_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "destinations.jsonl"),
+)
+
+# Minimum Dice similarity for a fuzzy candidate to be considered
+FUZZY_MIN_SCORE = 0.5
+
+# Edits allowed between a query and a fuzzy match: 1 for short names, 2 from
+# FUZZY_LONG_KEY characters. Dropped, doubled or swapped letters cost 1 and a
+# changed letter costs 2, so "Parma" never becomes Paris nor "Grenada" Granada.
+FUZZY_LONG_KEY = 8
+
+# Fuzzy candidates come from the query's rarest trigrams only; the best
+# FUZZY_CANDIDATES by overlap are then scored exactly
+FUZZY_CANDIDATES = 16
+
+# Interest tag -> words that select it in a free-text interest
+INTEREST_TAGS = {
+    "adventure": ("adventure", "hiking", "hike", "trek", "trekking", "climbing", "ski", "skiing", "diving", "surf", "surfing"),
+    "food": ("food", "dining", "cuisine", "culinary", "eat", "eating", "wine", "gastronomy"),
+    "culture": ("culture", "history", "historic", "museum", "museums", "art", "architecture", "heritage"),
+    "relaxation": ("relaxation", "relax", "beach", "beaches", "spa", "wellness", "chill"),
+    "nature": ("nature", "wildlife", "parks", "national", "mountains", "outdoors", "scenery"),
+    "nightlife": ("nightlife", "party", "parties", "clubs", "clubbing", "bars"),
+    "shopping": ("shopping", "shop", "markets", "fashion"),
+    "budget": ("budget", "cheap", "affordable", "backpacking"),
+}
+
+# Normalized alternative names and ISO codes -> normalized catalog country,
+# for the country part of "Name, Country" queries
+COUNTRY_ALIASES = {
+    "fr": "france", "fra": "france",
+    "jp": "japan", "jpn": "japan",
+    "it": "italy", "ita": "italy", "italia": "italy",
+    "es": "spain", "esp": "spain", "espana": "spain",
+    "pt": "portugal", "prt": "portugal",
+    "us": "united states", "usa": "united states", "america": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom", "gb": "united kingdom", "gbr": "united kingdom",
+    "great britain": "united kingdom", "britain": "united kingdom", "england": "united kingdom",
+    "scotland": "united kingdom",
+    "th": "thailand", "tha": "thailand",
+    "id": "indonesia", "idn": "indonesia",
+    "mx": "mexico", "mex": "mexico",
+    "pe": "peru", "per": "peru",
+    "gr": "greece", "grc": "greece", "hellas": "greece",
+    "ma": "morocco", "mar": "morocco",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """'  Tokyo, JAPAN! ' -> 'tokyo japan'; 'Córdoba' -> 'cordoba'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def _trigrams(key: str):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _typo_distance(a: str, b: str) -> int:
+    """Edit distance with insert/delete/adjacent swap at 1 and substitution at 2."""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            if a[i - 1] == b[j - 1]:
+                cur[j] = prev[j - 1]
+            else:
+                cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + 2)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _same_country(text: str, country: str) -> bool:
+    """True if text (the part after a comma) is empty or names country."""
+    text, country = normalize(text), normalize(country)
+    return not text or text == country or COUNTRY_ALIASES.get(text) == country
+
+
+def interest_tags(interest: str) -> set:
+    words = set(normalize(interest).split())
+    return {tag for tag, keywords in INTEREST_TAGS.items() if words.intersection(keywords)}
+
+
+class Place(NamedTuple):
+    name: str
+    country: str
+    tags: Tuple[str, ...]
+    attractions: Tuple[str, ...]
+    restaurants: Tuple[str, ...]
+    weather: str
+    description: str
+
+
+class DestinationCatalog:
+    def __init__(self, path: str = DESTINATION_CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._places = []       # place id -> Place
+        self._keys = []         # key id -> normalized key
+        self._key_place = None  # key id -> place id
+        self._exact = {}        # normalized key -> key id
+        self._sorted = []       # (key, key id), sorted for prefix search
+        self._trigrams = {}     # trigram -> array of key ids
+        self._by_country = {}   # normalized country -> [place id]
+        self.lookup = lru_cache(maxsize=4096)(self._resolve)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._places)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def warm(self):
+        """Loads the catalog now (e.g. from a background thread at startup)."""
+        self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            print(f"Destination catalog not found: {self.path}")
+            self._key_place = array("I")
+            return
+
+        key_place = array("I")
+        fuzzy_ids = array("I")
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                place_id = len(self._places)
+                self._places.append(Place(
+                    name=row["name"],
+                    country=row.get("country", ""),
+                    tags=tuple(row.get("tags", ())),
+                    attractions=tuple(row.get("attractions", ())),
+                    restaurants=tuple(row.get("restaurants", ())),
+                    weather=row.get("weather", ""),
+                    description=row.get("description", ""),
+                ))
+                self._by_country.setdefault(normalize(row.get("country", "")), []).append(place_id)
+
+                names = [row["name"], *row.get("aliases", ())]
+                for name in names:
+                    for key, fuzzy in ((normalize(name), True), (normalize(f"{name} {row.get('country', '')}"), False)):
+                        if key and key not in self._exact:
+                            key_id = len(self._keys)
+                            self._exact[key] = key_id
+                            self._keys.append(key)
+                            key_place.append(place_id)
+                            if fuzzy:
+                                fuzzy_ids.append(key_id)
+
+        self._key_place = key_place
+        self._sorted = sorted((key, key_id) for key, key_id in self._exact.items())
+        trigrams = {}
+        for key_id in fuzzy_ids:
+            for tri in _trigrams(self._keys[key_id]):
+                posting = trigrams.get(tri)
+                if posting is None:
+                    posting = trigrams[tri] = array("I")
+                posting.append(key_id)
+        self._trigrams = trigrams
+
+    def _resolve(self, query: str) -> Optional[Place]:
+        self._ensure_loaded()
+        key = normalize(query)
+        if not key:
+            return None
+
+        # 1) exact name, alias or "name country"
+        key_id = self._exact.get(key)
+        if key_id is not None:
+            return self._places[self._key_place[key_id]]
+
+        # 2) "Name, Country" where only the name part is known. A place of the
+        # same name in another country ("Paris, Texas") is not ours: no match.
+        if "," in query:
+            name, country = query.split(",", 1)
+            head = self._resolve(name)
+            if head is not None and _same_country(country, head.country):
+                return head
+            return None
+
+        # 3) prefix ("barcel" -> Barcelona)
+        if len(key) >= 3:
+            i = bisect.bisect_left(self._sorted, (key, -1))
+            if i < len(self._sorted) and self._sorted[i][0].startswith(key):
+                return self._places[self._key_place[self._sorted[i][1]]]
+
+        # 4) fuzzy trigram match for misspellings. Common trigrams have long
+        # posting lists but hardly discriminate, so only the rarest half is
+        # used to gather candidates; those are then scored exactly (Dice) and
+        # the best one must also be within a typo or two of the query.
+        query_tris = _trigrams(key)
+        postings = sorted((p for p in map(self._trigrams.get, query_tris) if p), key=len)
+        hits = {}
+        for posting in postings[:max(3, len(postings) // 2)]:
+            for kid in posting:
+                hits[kid] = hits.get(kid, 0) + 1
+        best_id, best_score = None, 0.0
+        for kid in heapq.nlargest(FUZZY_CANDIDATES, hits, key=hits.get):
+            key_tris = _trigrams(self._keys[kid])
+            score = 2.0 * len(query_tris & key_tris) / (len(query_tris) + len(key_tris))
+            if score > best_score:
+                best_id, best_score = kid, score
+        if best_id is None or best_score < FUZZY_MIN_SCORE:
+            return None
+        best = self._keys[best_id]
+        allowed = 2 if len(best) >= FUZZY_LONG_KEY else 1
+        if abs(len(best) - len(key)) > allowed or _typo_distance(key, best) > allowed:
+            # Close to a known name but not a plausible typo of it: more likely
+            # a different real place than one we have data for
+            return None
+        return self._places[self._key_place[best_id]]
+
+    def places_in(self, country: str, tags: set = None, limit: int = 10) -> List[Place]:
+        """
+        Places in a country. With tags, only places sharing at least one of
+        them are returned, those sharing the most first.
+        """
+        self._ensure_loaded()
+        ids = self._by_country.get(normalize(country), ())
+        places = [self._places[i] for i in ids]
+        if tags:
+            places = [p for p in places if tags.intersection(p.tags)]
+            places.sort(key=lambda p: -len(tags.intersection(p.tags)))
+        return places[:limit]
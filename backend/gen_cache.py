@@ -0,0 +1,215 @@
+"""
+Two-tier cache for deterministic Ollama generations.
+
+Every call has a fixed model, prompt and options (including the seed), so the
+same request always yields the same text. Results are kept in a bounded
+in-memory LRU with TTL, backed by a SQLite file that survives restarts and
+is periodically purged of expired rows and trimmed to a maximum row count.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "1") != "0"
+GENERATION_CACHE_PATH = os.getenv(
+    "GENERATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generation_cache.sqlite3"),
+)
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1024"))
+GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", "3600"))
+GENERATION_CACHE_DISK_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_DISK_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_DISK_MAX_ENTRIES", "50000"))
+
+# The disk tier is purged every this many writes (and when opened), so it may
+# briefly exceed its row limit by up to this much
+DISK_PURGE_EVERY = 100
+
+
+def cache_key(payload: dict) -> str:
+    """Content address of a generate payload (model, prompt, options incl. seed, context)."""
+    material = {
+        "model": payload.get("model"),
+        "prompt": payload.get("prompt"),
+        "format": payload.get("format"),
+        "options": payload.get("options", {}),
+    }
+    if payload.get("context"):
+        material["context"] = payload["context"]
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _DiskStore:
+    def __init__(self, path: str, max_age: float, max_rows: int):
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_created_at ON generations (created_at)")
+        with self._lock:
+            self._purge()
+            self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT model, response, created_at FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.max_age:
+            return None
+        return row[0], row[1]
+
+    def put(self, key: str, model: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time()),
+            )
+            self._puts += 1
+            if self._puts % DISK_PURGE_EVERY == 0:
+                self._purge()
+            self._conn.commit()
+
+    def _purge(self) -> int:
+        """Deletes expired rows, then the oldest ones above max_rows. Caller holds the lock."""
+        removed = self._conn.execute(
+            "DELETE FROM generations WHERE created_at < ?", (time.time() - self.max_age,)
+        ).rowcount
+        removed += self._conn.execute(
+            "DELETE FROM generations WHERE key IN ("
+            " SELECT key FROM generations ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (max(0, self.max_rows),),
+        ).rowcount
+        return removed
+
+    def delete(self, key: str = None, model: str = None) -> int:
+        with self._lock:
+            if key is not None:
+                cur = self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+            elif model is not None:
+                cur = self._conn.execute("DELETE FROM generations WHERE model = ?", (model,))
+            else:
+                cur = self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
+            return cur.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class GenerationCache:
+    def __init__(
+        self,
+        path: str = GENERATION_CACHE_PATH,
+        max_entries: int = GENERATION_CACHE_MAX_ENTRIES,
+        ttl: float = GENERATION_CACHE_TTL_SECONDS,
+        disk_ttl: float = GENERATION_CACHE_DISK_TTL_SECONDS,
+        disk_max_entries: int = GENERATION_CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_ttl = disk_ttl
+        self._memory = OrderedDict()  # key -> (expires_at, model, response)
+        self._disk = _DiskStore(path, disk_ttl, disk_max_entries) if path else None
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def _memory_get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._memory[key]
+            self.stats["expirations"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return entry[2]
+
+    def _memory_put(self, key: str, model: str, response: str):
+        self._memory[key] = (time.monotonic() + self.ttl, model, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get(self, key: str):
+        response = self._memory_get(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            return response
+
+        if self._disk is not None:
+            row = await asyncio.to_thread(self._disk.get, key)
+            if row is not None:
+                model, response = row
+                self.stats["disk_hits"] += 1
+                self._memory_put(key, model, response)
+                return response
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, model: str, response: str):
+        self._memory_put(key, model, response)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.put, key, model, response)
+
+    async def invalidate(self, key: str = None, model: str = None) -> dict:
+        """Drops one key, every entry for a model, or everything."""
+        if key is not None:
+            removed_memory = 1 if self._memory.pop(key, None) is not None else 0
+        elif model is not None:
+            stale = [k for k, (_, m, _) in self._memory.items() if m == model]
+            for k in stale:
+                del self._memory[k]
+            removed_memory = len(stale)
+        else:
+            removed_memory = len(self._memory)
+            self._memory.clear()
+
+        removed_disk = 0
+        if self._disk is not None:
+            removed_disk = await asyncio.to_thread(self._disk.delete, key, model)
+        return {"memory": removed_memory, "disk": removed_disk}
+
+    async def snapshot(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        disk_entries = await asyncio.to_thread(self._disk.count) if self._disk is not None else 0
+        return {
+            **self.stats,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+            "max_entries": self.max_entries,
+            "disk_max_entries": self._disk.max_rows if self._disk is not None else 0,
+        }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
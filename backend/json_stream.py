@@ -0,0 +1,80 @@
+"""
+Incremental extraction of the first top-level JSON object from model output.
+
+Text can be fed in arbitrary chunks (e.g. streamed tokens). Brace depth and
+string/escape state carry across chunk boundaries, and the scanner reports
+the object as soon as its closing brace arrives, so generation can be
+stopped right there.
+"""
+import re
+
+# Only these characters change scanner state; regex search skips the rest in C
+_OUTSIDE_STRING = re.compile(r'[{}"]')
+_INSIDE_STRING = re.compile(r'["\\]')
+
+
+class JsonObjectScanner:
+    def __init__(self):
+        self._chunks = []
+        self._depth = 0
+        self._in_str = False
+        self._skip = 0  # escaped char still to come in the next chunk
+        self.started = False
+        self.result = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str):
+        """
+        Adds a chunk of text. Returns the text of the first complete
+        top-level object once it has closed, otherwise None.
+        """
+        if self.result is not None or not chunk:
+            return self.result
+
+        if not self.started:
+            start = chunk.find("{")
+            if start == -1:
+                return None
+            chunk = chunk[start:]
+            self.started = True
+
+        # Each chunk is scanned on its own; only the state carries over
+        pos = self._skip
+        end = len(chunk)
+
+        while True:
+            if self._in_str:
+                m = _INSIDE_STRING.search(chunk, pos)
+                if m is None:
+                    break
+                if m.group() == "\\":
+                    pos = m.end() + 1
+                    continue
+                self._in_str = False
+                pos = m.end()
+                continue
+
+            m = _OUTSIDE_STRING.search(chunk, pos)
+            if m is None:
+                break
+
+            ch = m.group()
+            pos = m.end()
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._chunks.append(chunk[:pos])
+                    self.result = "".join(self._chunks)
+                    self._chunks = []
+                    return self.result
+
+        self._skip = max(0, pos - end)
+        self._chunks.append(chunk)
+        return None
@@ -1,13 +1,160 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List
-import requests
+from typing import Callable, List, Optional
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import hmac
 import json
+import os
+import time
 import traceback
 import re
 
-app = FastAPI(title="AI Travel Planner API (Local LLM via Ollama)")
+from ollama_client import OllamaClient
+from gen_cache import GenerationCache, GENERATION_CACHE_ENABLED, cache_key
+from json_stream import JsonObjectScanner
+from singleflight import SingleFlight
+from scheduler import GenerationScheduler, SchedulerBusy, OLLAMA_MAX_CONCURRENT
+from metrics import REGISTRY, MetricsMiddleware
+from catalog import DestinationCatalog, interest_tags
+from plan_jobs import JobStore, PlanJobQueue, JobDeferred, IdempotencyConflict
+
+# Shared async client for every LLM call, balancing over the OLLAMA_URLS pool
+ollama = OllamaClient()
+
+# Seeded generations are deterministic, so their outputs are cached
+generation_cache = GenerationCache() if GENERATION_CACHE_ENABLED else None
+
+# Identical concurrent generations share one in-flight Ollama call
+inflight = SingleFlight()
+
+# Bounded, prioritised access to the model's few parallel slots
+# (OLLAMA_MAX_CONCURRENT per healthy backend, following ejections)
+scheduler = GenerationScheduler(OLLAMA_MAX_CONCURRENT * len(ollama.backends))
+ollama.on_health_change = lambda healthy: scheduler.resize(OLLAMA_MAX_CONCURRENT * max(1, healthy))
+
+# Request class -> (priority, max seconds a generation may wait in queue).
+# Lower priority runs first, so quick suggestions overtake multi-day plans.
+REQUEST_CLASSES = {
+    "suggest": (0, float(os.getenv("SUGGEST_MAX_QUEUE_SECONDS", "15"))),
+    "plan": (10, float(os.getenv("PLAN_MAX_QUEUE_SECONDS", "60"))),
+    "job": (20, float(os.getenv("JOB_MAX_QUEUE_SECONDS", "600"))),
+}
+_request_class = ContextVar("request_class", default="plan")
+
+# Queue places plans and jobs leave free, so suggestions are still admitted
+# (and run first) while plans keep the model busy
+SUGGEST_QUEUE_HEADROOM = int(os.getenv("SUGGEST_QUEUE_HEADROOM", "4"))
+
+# ---------- Metrics ----------
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+HTTP_DURATION = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by endpoint", ("endpoint",))
+GENERATE_CALLS = REGISTRY.counter("ollama_generate_calls_total", "_ollama_generate calls by source (cache or model)", ("source",))
+GENERATE_DURATION = REGISTRY.histogram("ollama_generate_duration_seconds", "_ollama_generate latency including queueing", ("source",))
+QUEUE_WAIT = REGISTRY.histogram("ollama_queue_wait_seconds", "Time spent waiting for a model slot", ("request_class",))
+MODEL_CALLS = REGISTRY.counter("ollama_model_calls_total", "Calls sent to Ollama by outcome", ("outcome",))
+MODEL_DURATION = REGISTRY.histogram("ollama_model_duration_seconds", "Ollama call latency once a slot is held", ("outcome",))
+PREFILL_DURATION = REGISTRY.histogram(
+    "ollama_prompt_eval_seconds",
+    "Prompt prefill time: reported by Ollama (prompt_eval_duration) or measured to the first streamed token",
+    ("source",),
+)
+PROMPT_TOKENS = REGISTRY.counter("ollama_prompt_tokens_total", "Prompt tokens evaluated by Ollama (prompt_eval_count)")
+EVAL_TOKENS = REGISTRY.counter("ollama_eval_tokens_total", "Tokens generated by Ollama (eval_count, or streamed chunks if stopped early)")
+EVAL_SECONDS = REGISTRY.counter("ollama_eval_seconds_total", "Token generation time (eval_duration, or measured if stopped early)")
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    "ollama_eval_tokens_per_second", "Generation speed per call",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250),
+)
+EARLY_STOPS = REGISTRY.counter("ollama_early_stops_total", "Streams closed as soon as the JSON object was complete")
+JSON_EXTRACT_DURATION = REGISTRY.histogram(
+    "json_extract_duration_seconds", "_extract_json_object time by outcome", ("outcome",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+JSON_RETRIES = REGISTRY.counter("itinerary_json_retries_total", "Day generations retried because the JSON could not be parsed")
+PREFILL_TOKENS_SAVED = REGISTRY.counter("itinerary_prefill_tokens_saved_total", "Preamble tokens not re-evaluated thanks to batching and context reuse", labels=("source",))
+FALLBACK_ACTIVITIES = REGISTRY.counter("itinerary_fallback_activities_total", "Placeholder activities synthesized for incomplete days")
+REGISTRY.callback("scheduler_active", "Generations currently holding a model slot", lambda: scheduler.active)
+REGISTRY.callback("scheduler_queued", "Generations waiting for a model slot", lambda: scheduler.queued)
+REGISTRY.callback(
+    "scheduler_events_total", "Scheduler events (started, rejected, timed_out, cancelled)",
+    lambda: {(k,): v for k, v in scheduler.stats.items()}, ("event",), kind="counter",
+)
+REGISTRY.callback("singleflight_in_flight", "Distinct generations currently in flight", lambda: inflight.in_flight())
+REGISTRY.callback(
+    "singleflight_calls_total", "Coalescing outcomes (leaders, followers, abandoned)",
+    lambda: {(k,): v for k, v in inflight.stats.items()}, ("role",), kind="counter",
+)
+REGISTRY.callback(
+    "ollama_backend_healthy", "1 if the backend is in rotation, 0 while ejected",
+    lambda: {(b.url,): int(b.healthy) for b in ollama.backends}, ("backend",),
+)
+REGISTRY.callback(
+    "ollama_backend_outstanding", "Requests currently sent to each backend",
+    lambda: {(b.url,): b.outstanding for b in ollama.backends}, ("backend",),
+)
+REGISTRY.callback(
+    "ollama_backend_events_total", "Backend events (requests, failures, ejections, readmissions)",
+    lambda: {(b.url, k): v for b in ollama.backends for k, v in b.stats.items()}, ("backend", "event"), kind="counter",
+)
+REGISTRY.callback(
+    "generation_cache_events_total", "Generation cache lookups and evictions",
+    lambda: {(k,): v for k, v in generation_cache.stats.items()} if generation_cache is not None else {},
+    ("event",), kind="counter",
+)
+
+# Shared secret for /admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# How often a waiting endpoint checks whether its client went away
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Max days of one itinerary generated concurrently
+ITINERARY_DAY_CONCURRENCY = int(os.getenv("ITINERARY_DAY_CONCURRENCY", "4"))
+
+# Generations the current request was admitted for (None: not admitted, e.g. jobs)
+_request_fanout = ContextVar("request_fanout", default=None)
+
+# Stream generations and stop as soon as the first JSON object closes
+OLLAMA_EARLY_STOP = os.getenv("OLLAMA_EARLY_STOP", "1") != "0"
+
+# How long Ollama keeps the model (and its prompt cache) loaded after a call
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+
+# CPU threads per generation; 0 lets each backend use its own default
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "4"))
+
+# Days generated per LLM call. 1 keeps the one-prompt-per-day mode; larger
+# batches share one trip preamble that is prefilled once and reused via context.
+ITINERARY_BATCH_SIZE = int(os.getenv("ITINERARY_BATCH_SIZE", "1"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the catalog indexes off the event loop instead of on first lookup
+    asyncio.get_running_loop().run_in_executor(None, catalog.warm)
+    await ollama.start()
+    await plan_jobs.start()
+    yield
+    await plan_jobs.stop()
+    plan_jobs.store.close()
+    await ollama.close()
+    if generation_cache is not None:
+        generation_cache.close()
+
+
+app = FastAPI(title="AI Travel Planner API (Local LLM via Ollama)", lifespan=lifespan)
+
+app.add_middleware(
+    MetricsMiddleware,
+    requests_total=HTTP_REQUESTS,
+    request_duration=HTTP_DURATION,
+    clock=time.perf_counter,
+)
 
 # Allow React frontend
 app.add_middleware(
@@ -33,52 +180,242 @@ class DistrictSuggestionRequest(BaseModel):
     country: str
     interest: str
 
-# ---------- Mock destination info ----------
-MOCK_DATA = {
-    "Paris": {
-        "attractions": ["Eiffel Tower", "Louvre Museum", "Notre Dame"],
-        "restaurants": ["Le Jules Verne", "Café de Flore"],
-        "weather": "Sunny, 22°C"
-    },
-    "Tokyo": {
-        "attractions": ["Shibuya Crossing", "Tokyo Tower", "Senso-ji"],
-        "restaurants": ["Sukiyabashi Jiro", "Ichiran Ramen"],
-        "weather": "Cloudy, 18°C"
-    }
-}
+# ---------- Destination catalog ----------
+# Loaded in a background thread at startup (or by the first lookup)
+catalog = DestinationCatalog()
+
+# /suggest_districts answers straight from the catalog when it knows this many
+CATALOG_DISTRICT_SUGGESTIONS = int(os.getenv("CATALOG_DISTRICT_SUGGESTIONS", "4"))
+
+
+async def _catalog_call(fn, *args):
+    """
+    Runs a catalog query. While the catalog is still loading the query waits
+    for it in a worker thread, so the event loop keeps serving other requests.
+    """
+    if catalog.loaded:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"success": False, "error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _admit(request_class: str, want: int = 1) -> Callable[[], None]:
+    """
+    Admits a request that will run up to want generations at once and tags
+    its LLM calls (and tasks it spawns) with its scheduling class and granted
+    fan-out. Refuses the request if the queue has no room for it. Returns the
+    function that gives its room back; call it when the request is done.
+    """
+    # Never reserve so much that a small queue admits no plans at all
+    headroom = 0 if request_class == "suggest" else min(SUGGEST_QUEUE_HEADROOM, scheduler.max_queue // 2)
+    granted = scheduler.admit(want, headroom)
+    _request_class.set(request_class)
+    _request_fanout.set(granted)
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            scheduler.release(granted)
+
+    return release
+
+
+def _plan_fanout(request: TravelRequest) -> int:
+    """Generations a plan runs at once: one per batch, capped by ITINERARY_DAY_CONCURRENCY."""
+    batches = -(-max(1, request.days) // max(1, ITINERARY_BATCH_SIZE))
+    return max(1, min(ITINERARY_DAY_CONCURRENCY, batches))
+
 
 @app.get("/")
 def home():
     return {"message": "AI Travel Planner API is running (Ollama)!"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, queue, model and parsing metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/plan")
-async def plan_trip(request: TravelRequest):
+async def plan_trip(request: TravelRequest, http_request: Request):
+    release = _admit("plan", _plan_fanout(request))
     try:
         destination_info = await get_destination_data(request.destination)
-        itinerary = await generate_itinerary_with_ollama(request, destination_info)
-        estimated_cost = calculate_cost(request.days, request.budget, request.travelers)
+        itinerary = await _cancel_on_disconnect(
+            http_request, generate_itinerary_with_ollama(request, destination_info)
+        )
+        return _plan_response(request, destination_info, itinerary)
 
-        return {
-            "success": True,
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        print(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        release()
+
+
+def _plan_response(request: TravelRequest, destination_info: dict, itinerary: dict) -> dict:
+    estimated_cost = calculate_cost(request.days, request.budget, request.travelers)
+
+    return {
+        "success": True,
+        "destination": request.destination,
+        "days": request.days,
+        "travelers": request.travelers,
+        "itinerary": itinerary,
+        "estimated_cost": estimated_cost,
+        "destination_info": destination_info
+    }
+
+
+async def _run_plan_job(job_request: dict, completed: dict, save_day) -> dict:
+    """
+    Runner for background plan jobs. Days already saved by an earlier
+    (interrupted) run are reused instead of generated again.
+    """
+    request = TravelRequest(**job_request)
+    _request_class.set("job")
+    try:
+        destination_info = await get_destination_data(request.destination)
+        stats = {}
+        structured_days = []
+        async for day in iter_itinerary_days(request, destination_info, stats=stats, completed=completed):
+            structured_days.append(day)
+            day_num = len(structured_days)
+            if day_num not in completed:
+                await save_day(day_num, day)
+    except SchedulerBusy as e:
+        raise JobDeferred(e.retry_after)
+
+    itinerary = {"text": _trip_overview(request), "structured": structured_days, "generation": stats}
+    return _plan_response(request, destination_info, itinerary)
+
+
+plan_jobs = PlanJobQueue(JobStore(), _run_plan_job)
+
+
+@app.post("/plan/jobs")
+async def create_plan_job(request: TravelRequest, idempotency_key: Optional[str] = Header(default=None)):
+    """
+    Queues a plan for background generation and returns its job id at once.
+    Resubmitting with the same Idempotency-Key returns the original job.
+    """
+    try:
+        job_id, created = await plan_jobs.submit(request.model_dump(), idempotency_key)
+    except IdempotencyConflict as e:
+        return JSONResponse(status_code=409, content={"success": False, "error": str(e)})
+
+    job = await plan_jobs.get(job_id)
+    return JSONResponse(
+        status_code=202 if created else 200,
+        content={"success": True, "job_id": job_id, "status": job["status"], "created": created},
+    )
+
+
+@app.get("/plan/jobs/{job_id}")
+async def get_plan_job(job_id: str):
+    """
+    Job status plus every day finished so far; "result" holds the full
+    /plan response once the job is done.
+    """
+    job = await plan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "success": job["status"] != "failed",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "days_total": job["request"].get("days"),
+        "days_completed": len(job["days"]),
+        "days": [job["days"][d] for d in sorted(job["days"])],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+
+@app.post("/plan/stream")
+async def plan_trip_stream(request: TravelRequest):
+    """
+    Streams the plan as NDJSON: a "meta" line with cost and destination info
+    right away, "token" lines while the model writes, one "day" line per
+    finished day (in order), then a final "done" or "error" line.
+    """
+    release = _admit("plan", _plan_fanout(request))
+    fanout = _request_fanout.get()
+    try:
+        destination_info = await get_destination_data(request.destination)
+    except BaseException:
+        release()
+        raise
+    estimated_cost = calculate_cost(request.days, request.budget, request.travelers)
+
+    async def events():
+        queue = asyncio.Queue()
+
+        def on_progress(day_num: int, text: str):
+            queue.put_nowait({"type": "token", "day": day_num, "text": text})
+
+        async def produce():
+            _request_class.set("plan")
+            _request_fanout.set(fanout)
+            stats = {}
+            try:
+                async for day in iter_itinerary_days(request, destination_info, on_progress, stats):
+                    queue.put_nowait({"type": "day", "day": day})
+                queue.put_nowait({"type": "done", "success": True, "text": _trip_overview(request), "generation": stats})
+            except Exception as e:
+                print(traceback.format_exc())
+                queue.put_nowait({"type": "error", "success": False, "error": str(e)})
+
+        yield _ndjson({
+            "type": "meta",
             "destination": request.destination,
             "days": request.days,
             "travelers": request.travelers,
-            "itinerary": itinerary,
             "estimated_cost": estimated_cost,
-            "destination_info": destination_info
-        }
+            "destination_info": destination_info,
+        })
 
-    except Exception as e:
-        print(traceback.format_exc())
-        return {"success": False, "error": str(e)}
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                event = await queue.get()
+                yield _ndjson(event)
+                if event["type"] in ("done", "error"):
+                    break
+        finally:
+            # Client went away (or we finished): stop any remaining generation
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    # Runs after the body, and also when a disconnect stops it before it starts
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
+def _ndjson(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
 
 
 @app.post("/suggest_destinations")
-async def suggest_destinations(request: DestinationSuggestionRequest):
+async def suggest_destinations(request: DestinationSuggestionRequest, http_request: Request):
     """
     Suggests 5 countries based on interest.
     """
+    release = _admit("suggest")
     try:
         prompt = f"""
 You are a travel expert. Suggest top 5 countries for a traveler interested in: "{request.interest}".
@@ -89,48 +426,151 @@ Return ONLY a JSON object with this valid field:
 ]
 Do NOT return markdown. return ONLY JSON.
 """
-        raw = _ollama_generate(prompt, seed=42)
+        raw = await _cancel_on_disconnect(http_request, _ollama_generate(prompt, seed=42))
         data = _extract_json_object(raw)
         return {"success": True, "suggestions": data.get("suggestions", [])}
+    except SchedulerBusy:
+        raise
     except Exception as e:
         print(traceback.format_exc())
         return {"success": False, "error": str(e)}
+    finally:
+        release()
 
 
 @app.post("/suggest_districts")
-async def suggest_districts(request: DistrictSuggestionRequest):
+async def suggest_districts(request: DistrictSuggestionRequest, http_request: Request):
     """
     Suggests 4-5 districts or cities within a specific country for the interest.
+    Answered from the destination catalog when the interest maps to known tags
+    and enough places carry them; otherwise the catalog's places for the
+    country are offered to the model as hints only.
     """
+    tags = interest_tags(request.interest)
+    candidates = await _catalog_call(catalog.places_in, request.country, tags)
+    # Without tags places_in returns the whole country, unrelated to the interest
+    if tags and len(candidates) >= CATALOG_DISTRICT_SUGGESTIONS:
+        return {
+            "success": True,
+            "source": "catalog",
+            "suggestions": [
+                {"name": p.name, "description": p.description, "image_keyword": f"{p.name} {p.country}"}
+                for p in candidates[:CATALOG_DISTRICT_SUGGESTIONS]
+            ],
+        }
+
+    release = _admit("suggest")
     try:
+        hint = ""
+        if candidates:
+            hint = f"Known good matches you may include: {', '.join(p.name for p in candidates)}.\n"
         prompt = f"""
 You are a travel expert. The user selected "{request.country}" for "{request.interest}".
 Suggest top 4 specific districts, cities, or regions in {request.country} that fit this interest.
-Return ONLY a JSON object with this valid field:
+{hint}Return ONLY a JSON object with this valid field:
 "suggestions": [
   {{"name": "District/City Name", "description": "Why it's great", "image_keyword": "search term for unsplash"}},
   ...
 ]
 Do NOT return markdown. return ONLY JSON.
 """
-        raw = _ollama_generate(prompt, seed=123)
+        raw = await _cancel_on_disconnect(http_request, _ollama_generate(prompt, seed=123))
         data = _extract_json_object(raw)
         return {"success": True, "suggestions": data.get("suggestions", [])}
+    except SchedulerBusy:
+        raise
     except Exception as e:
         print(traceback.format_exc())
         return {"success": False, "error": str(e)}
+    finally:
+        release()
+
+
+def _check_admin(token: str):
+    if not ADMIN_TOKEN:
+        # The API listens on all interfaces; never expose cache deletion unauthenticated
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/cache")
+async def cache_stats(x_admin_token: str = Header(default="")):
+    _check_admin(x_admin_token)
+    if generation_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **(await generation_cache.snapshot())}
+
+
+@app.delete("/admin/cache")
+async def invalidate_cache(key: str = None, model: str = None, x_admin_token: str = Header(default="")):
+    """
+    Drops cached generations: a single key, every entry for a model, or all.
+    """
+    _check_admin(x_admin_token)
+    if generation_cache is None:
+        return {"enabled": False, "removed": {"memory": 0, "disk": 0}}
+    removed = await generation_cache.invalidate(key=key, model=model)
+    return {"enabled": True, "removed": removed}
+
+
+@app.get("/admin/inflight")
+async def inflight_stats(x_admin_token: str = Header(default="")):
+    _check_admin(x_admin_token)
+    return {"in_flight": inflight.in_flight(), **inflight.stats}
+
+
+@app.get("/admin/backends")
+async def backend_stats(x_admin_token: str = Header(default="")):
+    _check_admin(x_admin_token)
+    return {"backends": ollama.snapshot()}
+
+
+@app.get("/admin/scheduler")
+async def scheduler_stats(x_admin_token: str = Header(default="")):
+    _check_admin(x_admin_token)
+    return {
+        "active": scheduler.active,
+        "queued": scheduler.queued,
+        "demand": scheduler.demand,
+        "max_concurrent": scheduler.max_concurrent,
+        "max_queue": scheduler.max_queue,
+        "retry_after": scheduler.retry_after(),
+        **scheduler.stats,
+    }
 
 
 async def get_destination_data(destination: str):
-    # Use mock for now
-    return MOCK_DATA.get(destination, {
-        "attractions": [f"Top sights in {destination}"],
-        "restaurants": ["Local cuisine"],
-        "weather": "Check local forecast"
-    })
+    # Tolerates case, accents, "City, Country" and small misspellings
+    place = await _catalog_call(catalog.lookup, destination)
+    if place is None:
+        return {
+            "attractions": [f"Top sights in {destination}"],
+            "restaurants": ["Local cuisine"],
+            "weather": "Check local forecast"
+        }
+
+    return {
+        "name": place.name,
+        "country": place.country,
+        "attractions": list(place.attractions),
+        "restaurants": list(place.restaurants),
+        "weather": place.weather
+    }
 
 
 def _extract_json_object(text: str) -> dict:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        obj = _parse_json_object(text)
+        outcome = "ok"
+        return obj
+    finally:
+        JSON_EXTRACT_DURATION.observe(time.perf_counter() - started, outcome)
+
+
+def _parse_json_object(text: str) -> dict:
     if not text:
         raise ValueError("Empty model response")
 
@@ -143,106 +583,252 @@ def _extract_json_object(text: str) -> dict:
         pass
 
     # 2) balanced braces scan (safe)
-    start = text.find("{")
-    if start == -1:
+    scanner = JsonObjectScanner()
+    candidate = scanner.feed(text)
+    if not scanner.started:
         raise ValueError("No JSON object found in model output")
-
-    depth = 0
-    in_str = False
-    escape = False
-
-    for i in range(start, len(text)):
-        ch = text[i]
-
-        if in_str:
-            if escape:
-                escape = False
-            elif ch == "\\":
-                escape = True
-            elif ch == '"':
-                in_str = False
-            continue
-
-        if ch == '"':
-            in_str = True
-            continue
-
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                candidate = text[start:i+1]
-                return json.loads(candidate)
+    if candidate is not None:
+        return json.loads(candidate)
 
     raise ValueError("JSON braces not closed / invalid JSON from model")
 
 
 
-def _ollama_generate(prompt: str, seed: int) -> str:
-    r = requests.post(
-        "http://localhost:11434/api/generate",
-        headers={"Content-Type": "application/json"},
-        json={
-            "model": "phi3:mini",
-            "prompt": prompt,
-            "stream": False,
-            "format": "json",   # ✅ IMPORTANT: force JSON
-            "options": {
-                "temperature": 0.4,
-                "top_p": 0.9,
-                "num_predict": 450,
-                "num_thread": 4,
-                "seed": seed      # ✅ IMPORTANT: different output per day
-            }
-        },
-        timeout=120
-    )
+async def _ollama_generate(prompt: str, seed: int, timeout: float = None,
+                           on_chunk: Optional[Callable[[str], None]] = None,
+                           context: Optional[List[int]] = None, num_predict: int = 450,
+                           route_key: Optional[str] = None, usage: Optional[dict] = None) -> str:
+    """
+    Runs one generation. Ollama's streaming mode is used when on_chunk is
+    given (it receives each text fragment) or when OLLAMA_EARLY_STOP is on,
+    in which case the stream is closed once the first JSON object is complete.
+    context (from _ollama_prefill) continues an already evaluated prompt prefix.
+    Calls sharing a route_key (by default the cache key) go to the same backend.
+    usage, if given, receives Ollama's prompt_eval_count when this call ran on
+    the model and Ollama reported it (not for early-stopped streams).
+    """
+    payload = {
+        "model": "phi3:mini",
+        "prompt": prompt,
+        "stream": False,
+        "format": "json",   # ✅ IMPORTANT: force JSON
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": 0.4,
+            "top_p": 0.9,
+            "num_predict": num_predict,
+            "num_thread": OLLAMA_NUM_THREAD,
+            "seed": seed      # ✅ IMPORTANT: different output per day
+        }
+    }
+    if context:
+        payload["context"] = context
+    if not OLLAMA_NUM_THREAD:
+        del payload["options"]["num_thread"]
 
-    if r.status_code != 200:
-        raise Exception(f"Ollama HTTP {r.status_code}: {r.text[:400]}")
+    started = time.perf_counter()
+    key = cache_key(payload)
+    if generation_cache is not None:
+        cached = await generation_cache.get(key)
+        if cached is not None:
+            GENERATE_CALLS.inc("cache")
+            GENERATE_DURATION.observe(time.perf_counter() - started, "cache")
+            return cached
 
-    data = r.json()
-    return (data.get("response") or "").strip()
+    route_key = route_key or key
+    try:
+        if on_chunk is not None:
+            # Token streams are per caller, so these are not coalesced
+            return await _ollama_fetch(payload, key, timeout, on_chunk, route_key, usage)
+        # The shared call queues with the leader's priority and deadline, so
+        # only callers of the same request class share it
+        return await inflight.do(_request_class.get() + ":" + key,
+                                 lambda: _ollama_fetch(payload, key, timeout, route_key=route_key, usage=usage))
+    finally:
+        GENERATE_CALLS.inc("model")
+        GENERATE_DURATION.observe(time.perf_counter() - started, "model")
 
 
+@asynccontextmanager
+async def _model_call():
+    """
+    Holds a scheduler slot for one Ollama call and records its queue wait,
+    outcome and duration.
+    """
+    request_class = _request_class.get()
+    priority, max_wait = REQUEST_CLASSES[request_class]
+    queued_at = time.perf_counter()
+    async with scheduler.slot(priority, max_wait):
+        started = time.perf_counter()
+        QUEUE_WAIT.observe(started - queued_at, request_class)
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            MODEL_CALLS.inc(outcome)
+            MODEL_DURATION.observe(time.perf_counter() - started, outcome)
 
-async def generate_itinerary_with_ollama(request: TravelRequest, destination_info: dict):
+
+async def _ollama_fetch(payload: dict, key: str, timeout: float = None,
+                        on_chunk: Optional[Callable[[str], None]] = None, route_key: Optional[str] = None,
+                        usage: Optional[dict] = None) -> str:
+    async with _model_call():
+        response = await _ollama_run(payload, timeout, on_chunk, route_key, usage)
+
+    if generation_cache is not None and response:
+        await generation_cache.put(key, payload["model"], response)
+    return response
+
+
+async def _ollama_prefill(prompt: str, seed: int, route_key: Optional[str] = None) -> tuple:
     """
-    Generates itinerary day-by-day to reduce repetition and improve structure.
-    Returns: { "text": "...", "structured": [...] }
+    Evaluates a shared prompt prefix once and returns (context, prompt_tokens);
+    prompt_tokens is Ollama's prompt_eval_count, or None if not reported.
+    Later calls pass the context back (with the same route_key, so they reach
+    the same backend) and Ollama skips re-evaluating it.
     """
+    payload = {
+        "model": "phi3:mini",
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_predict": 1, "num_thread": OLLAMA_NUM_THREAD, "seed": seed},
+    }
+    if not OLLAMA_NUM_THREAD:
+        del payload["options"]["num_thread"]
 
-    attractions_list = destination_info.get("attractions", [])
-    interests = ", ".join(request.interests) if request.interests else "general sightseeing"
-
-    base_themes = [
-        "Iconic Landmarks & City Introduction",
-        "Food & Local Markets",
-        "Culture, Museums & History",
-        "Nature, Parks & Scenic Spots",
-        "Neighborhood Walks & Hidden Gems",
-        "Shopping & Modern City Life",
-        "Nightlife & Entertainment",
-        "Day Trip / Nearby Highlights",
-        "Relaxation & Wellness",
-        "Art, Architecture & Local Stories",
-    ]
-    themes = [base_themes[i % len(base_themes)] for i in range(request.days)]
-
-    structured_days = []
-    used_titles = set()
+    async def run():
+        async with _model_call():
+            data = await ollama.generate(payload, route_key=route_key)
+        _record_eval_stats(data, 0, None)
+        return data.get("context"), data.get("prompt_eval_count")
 
-    for day_num in range(1, request.days + 1):
-        day_attractions = attractions_list[(day_num - 1) * 2: (day_num - 1) * 2 + 4]
-        if not day_attractions:
-            day_attractions = attractions_list[:4]
+    # Identical trips of the same request class planned at the same time
+    # share one prefill
+    return await inflight.do(_request_class.get() + ":prefill:" + cache_key(payload), run)
 
-        prompt = f"""
+
+def _record_eval_stats(final: dict, chunks: int, first_token_at: Optional[float],
+                       requested_at: Optional[float] = None):
+    """
+    Records Ollama's own timings from the final response/chunk. Streams we
+    stopped early have no final chunk, so chunk count and wall time are used,
+    and for every stream the time from request to first token is recorded as
+    a measured prefill (it also covers network and backend queueing).
+    """
+    if requested_at is not None and first_token_at is not None:
+        PREFILL_DURATION.observe(first_token_at - requested_at, "measured")
+    if final.get("eval_count"):
+        PROMPT_TOKENS.inc(amount=final.get("prompt_eval_count", 0))
+        if final.get("prompt_eval_duration"):
+            PREFILL_DURATION.observe(final["prompt_eval_duration"] / 1e9, "reported")
+        tokens, seconds = final["eval_count"], final.get("eval_duration", 0) / 1e9
+    elif chunks and first_token_at is not None:
+        tokens, seconds = chunks, time.perf_counter() - first_token_at
+    else:
+        return
+
+    EVAL_TOKENS.inc(amount=tokens)
+    EVAL_SECONDS.inc(amount=seconds)
+    if seconds > 0:
+        TOKENS_PER_SECOND.observe(tokens / seconds)
+
+
+async def _ollama_run(payload: dict, timeout: float = None,
+                      on_chunk: Optional[Callable[[str], None]] = None, route_key: Optional[str] = None,
+                      usage: Optional[dict] = None) -> str:
+    if on_chunk is None and not OLLAMA_EARLY_STOP:
+        data = await ollama.generate(payload, timeout=timeout, route_key=route_key)
+        _record_eval_stats(data, 0, None)
+        if usage is not None and data.get("prompt_eval_count") is not None:
+            usage["prompt_eval_count"] = data["prompt_eval_count"]
+        return (data.get("response") or "").strip()
+
+    parts = []
+    final = {}
+    first_token_at = None
+    scanner = JsonObjectScanner() if OLLAMA_EARLY_STOP else None
+    requested_at = time.perf_counter()
+    stream = ollama.generate_stream(payload, timeout=timeout, route_key=route_key)
+    try:
+        async for chunk in stream:
+            if chunk.get("done"):
+                final = chunk
+            text = chunk.get("response") or ""
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            if on_chunk is not None:
+                on_chunk(text)
+            if scanner is not None and scanner.feed(text) is not None:
+                # Trailing tokens are never used; closing aborts generation
+                EARLY_STOPS.inc()
+                break
+    finally:
+        await stream.aclose()
+
+    _record_eval_stats(final, len(parts), first_token_at, requested_at)
+    if usage is not None and final.get("prompt_eval_count") is not None:
+        usage["prompt_eval_count"] = final["prompt_eval_count"]
+    if scanner is not None and scanner.done:
+        return scanner.result
+    return "".join(parts).strip()
+
+
+async def _cancel_on_disconnect(http_request: Request, coro):
+    """
+    Awaits coro, cancelling it (and its in-flight Ollama calls) if the
+    HTTP client disconnects before it finishes.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ConnectionAbortedError("Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+
+
+
+BASE_THEMES = [
+    "Iconic Landmarks & City Introduction",
+    "Food & Local Markets",
+    "Culture, Museums & History",
+    "Nature, Parks & Scenic Spots",
+    "Neighborhood Walks & Hidden Gems",
+    "Shopping & Modern City Life",
+    "Nightlife & Entertainment",
+    "Day Trip / Nearby Highlights",
+    "Relaxation & Wellness",
+    "Art, Architecture & Local Stories",
+]
+
+
+def _trip_interests(request: TravelRequest) -> str:
+    return ", ".join(request.interests) if request.interests else "general sightseeing"
+
+
+def _build_day_prompt(request: TravelRequest, day_num: int, theme: str, day_attractions: List[str]) -> str:
+    interests = _trip_interests(request)
+    return f"""
 You are a professional travel planner.
 
 Create ONLY Day {day_num} of the itinerary for {request.destination}.
-Theme: {themes[day_num - 1]}
+Theme: {theme}
 
 STRICT RULES:
 - Output ONLY a JSON object (no markdown, no extra text).
@@ -260,7 +846,7 @@ Suggested attractions today (use some): {", ".join(day_attractions)}
 Return JSON EXACTLY in this format:
 {{
   "day": {day_num},
-  "theme": "{themes[day_num - 1]}",
+  "theme": "{theme}",
   "estimated_cost": 150,
   "activities": [
     {{"time":"Morning","title":"Specific activity","description":"Concrete detail","cost":40}},
@@ -271,58 +857,309 @@ Return JSON EXACTLY in this format:
 }}
 """
 
-        raw = _ollama_generate(prompt, seed=1000 + day_num)
 
-        # Parse JSON (robust)
-        try:
-            day_obj = _extract_json_object(raw)
-        except Exception:
-            # One retry with stricter instruction if model misbehaves
-            retry_prompt = prompt + "\n\nIMPORTANT: Return ONLY JSON. Do not add any commentary."
-            raw2 =_ollama_generate(retry_prompt, seed=2000 + day_num)
-            day_obj = _extract_json_object(raw2)
-
-        # Normalize output
-        day_obj["day"] = day_obj.get("day", day_num)
-        day_obj["theme"] = day_obj.get("theme", themes[day_num - 1])
-        day_obj["estimated_cost"] = day_obj.get("estimated_cost", 150)
-        day_obj["notes"] = day_obj.get("notes", "Start early to avoid crowds.")
-
-        acts = day_obj.get("activities", [])
-        if not isinstance(acts, list):
-            acts = []
-
-        slots = ["Morning", "Afternoon", "Evening"]
-        # ensure exactly 3 activities
-        while len(acts) < 3:
-            acts.append({"time": slots[len(acts)], "title": f"Day {day_num} {slots[len(acts)]} Activity", "description": "Enjoy a local experience.", "cost": 0})
-        acts = acts[:3]
-
-        # De-duplicate titles across days
-        for i, a in enumerate(acts):
-            a["time"] = a.get("time") or slots[i]
-            a["description"] = a.get("description") or "Enjoy a local experience."
-            a["cost"] = a.get("cost", 0)
-
-            title = (a.get("title") or f"Day {day_num} {slots[i]} Activity").strip()
+def _day_attractions(attractions_list: List[str], day_num: int) -> List[str]:
+    day_attractions = attractions_list[(day_num - 1) * 2: (day_num - 1) * 2 + 4]
+    if not day_attractions:
+        day_attractions = attractions_list[:4]
+    return day_attractions
+
+
+def _build_trip_preamble(request: TravelRequest) -> str:
+    """
+    Everything the day batches of one trip have in common. In batch mode it
+    is prefilled once and the batches only send what differs.
+    """
+    interests = _trip_interests(request)
+    return f"""
+You are a professional travel planner writing a {request.days}-day itinerary for {request.destination}.
+
+STRICT RULES:
+- Output ONLY a JSON object (no markdown, no extra text).
+- Each day has exactly 3 activities: Morning, Afternoon, Evening.
+- Activity titles must be unique and never repeated across days.
+- Avoid generic text like "Explore the city". Be concrete.
+
+Trip details:
+- Budget: {request.budget}
+- Interests: {interests}
+- Travelers: {request.travelers}
+
+You will be asked for a few days at a time. Return JSON EXACTLY in this format:
+{{
+  "days": [
+    {{
+      "day": 1,
+      "theme": "Theme of the day",
+      "estimated_cost": 150,
+      "activities": [
+        {{"time":"Morning","title":"Specific activity","description":"Concrete detail","cost":40}},
+        {{"time":"Afternoon","title":"Different activity","description":"Different experience","cost":50}},
+        {{"time":"Evening","title":"Another unique activity","description":"No repetition allowed","cost":30}}
+      ],
+      "notes":"Unique local tip"
+    }}
+  ]
+}}
+"""
+
+
+def _build_batch_prompt(day_nums: List[int], themes: List[str], attractions_list: List[str]) -> str:
+    lines = [f"Create ONLY Days {day_nums[0]}-{day_nums[-1]}, one entry per day in \"days\":"]
+    for day_num in day_nums:
+        suggested = ", ".join(_day_attractions(attractions_list, day_num))
+        lines.append(f"- Day {day_num}: theme \"{themes[day_num - 1]}\"; suggested attractions (use some): {suggested}")
+    return "\n".join(lines) + "\n"
+
+
+async def _generate_batch(request: TravelRequest, day_nums: List[int], themes: List[str],
+                          attractions_list: List[str], preamble: str, context: Optional[List[int]],
+                          on_progress: Optional[Callable[[int, str], None]] = None,
+                          usage: Optional[dict] = None) -> dict:
+    """
+    Generates several days in one call and returns {day_num: raw day object}.
+    Days missing from a malformed batch fall back to per-day generation.
+    usage, if given, receives "batched_days" (days the batch call produced)
+    and the call's prompt_eval_count when Ollama reported it.
+    """
+    usage = {} if usage is None else usage
+    on_chunk = None
+    if on_progress is not None:
+        on_chunk = lambda text: on_progress(day_nums[0], text)
+
+    prompt = _build_batch_prompt(day_nums, themes, attractions_list)
+    if not context:
+        prompt = preamble + "\n" + prompt
+
+    days = {}
+    try:
+        # The batches reuse the preamble prefilled on the trip's backend
+        raw = await _ollama_generate(prompt, seed=1000 + day_nums[0], on_chunk=on_chunk,
+                                     context=context, num_predict=450 * len(day_nums), route_key=preamble,
+                                     usage=usage)
+        batch = _extract_json_object(raw).get("days", [])
+        for offset, day_obj in enumerate(batch if isinstance(batch, list) else []):
+            if offset < len(day_nums) and isinstance(day_obj, dict):
+                days[day_nums[offset]] = day_obj
+    except (ValueError, AttributeError):
+        pass
+    usage["batched_days"] = len(days)
+
+    missing = [d for d in day_nums if d not in days]
+    if missing:
+        JSON_RETRIES.inc(amount=len(missing))
+        results = await asyncio.gather(*(
+            _generate_day(request, d, themes[d - 1], attractions_list, on_progress) for d in missing
+        ))
+        days.update(zip(missing, results))
+    return days
+
+
+async def _generate_day(request: TravelRequest, day_num: int, theme: str, attractions_list: List[str],
+                        on_progress: Optional[Callable[[int, str], None]] = None) -> dict:
+    """
+    Generates the raw JSON object for a single day. Depends only on the
+    request and the day number, so days can be generated concurrently.
+    """
+    on_chunk = None
+    if on_progress is not None:
+        on_chunk = lambda text: on_progress(day_num, text)
+
+    day_attractions = _day_attractions(attractions_list, day_num)
+
+    prompt = _build_day_prompt(request, day_num, theme, day_attractions)
+    raw = await _ollama_generate(prompt, seed=1000 + day_num, on_chunk=on_chunk)
+
+    # Parse JSON (robust)
+    try:
+        return _extract_json_object(raw)
+    except Exception:
+        # One retry with stricter instruction if model misbehaves
+        JSON_RETRIES.inc()
+        retry_prompt = prompt + "\n\nIMPORTANT: Return ONLY JSON. Do not add any commentary."
+        raw2 = await _ollama_generate(retry_prompt, seed=2000 + day_num, on_chunk=on_chunk)
+        return _extract_json_object(raw2)
+
+
+def _normalize_day(day_obj: dict, day_num: int, theme: str, used_titles: set) -> dict:
+    """
+    Fills missing fields and de-duplicates activity titles against the
+    days already merged. Must be called in day order to stay deterministic.
+    """
+    day_obj["day"] = day_obj.get("day", day_num)
+    day_obj["theme"] = day_obj.get("theme", theme)
+    day_obj["estimated_cost"] = day_obj.get("estimated_cost", 150)
+    day_obj["notes"] = day_obj.get("notes", "Start early to avoid crowds.")
+
+    acts = day_obj.get("activities", [])
+    if not isinstance(acts, list):
+        acts = []
+
+    slots = ["Morning", "Afternoon", "Evening"]
+    # ensure exactly 3 activities
+    while len(acts) < 3:
+        FALLBACK_ACTIVITIES.inc()
+        acts.append({"time": slots[len(acts)], "title": f"Day {day_num} {slots[len(acts)]} Activity", "description": "Enjoy a local experience.", "cost": 0})
+    acts = acts[:3]
+
+    # De-duplicate titles across days
+    for i, a in enumerate(acts):
+        a["time"] = a.get("time") or slots[i]
+        a["description"] = a.get("description") or "Enjoy a local experience."
+        a["cost"] = a.get("cost", 0)
+
+        title = (a.get("title") or f"Day {day_num} {slots[i]} Activity").strip()
+        key = title.lower()
+        if key in used_titles:
+            title = f"{theme} — {title}"
             key = title.lower()
-            if key in used_titles:
-                title = f"{themes[day_num - 1]} — {title}"
-                key = title.lower()
-            used_titles.add(key)
-            a["title"] = title
+        used_titles.add(key)
+        a["title"] = title
+
+    day_obj["activities"] = acts
+    return day_obj
+
+
+class PrefillSavings:
+    """
+    Preamble tokens a trip's batch calls did not re-evaluate. Per-day
+    prompting evaluates the preamble once per day; with a prefilled context it
+    is evaluated once per trip, so days produced from the context save one
+    preamble each, less the one the prefill itself cost.
+
+    Only days a batch call actually produced count. They are "confirmed" when
+    Ollama reported a prompt_eval_count below the preamble, and "unconfirmed"
+    when the call reported none (early-stopped streams end before Ollama's
+    final chunk). A call that re-evaluated the preamble saves nothing.
+    """
+
+    def __init__(self, preamble_tokens: Optional[int]):
+        self.preamble_tokens = preamble_tokens or 0
+        self.days = {"confirmed": 0, "unconfirmed": 0}
+
+    def totals(self) -> dict:
+        # The prefill is charged to the confirmed days first, so the
+        # confirmed figure is never overstated
+        tokens = self.preamble_tokens
+        confirmed = max(0, tokens * (self.days["confirmed"] - 1))
+        total = max(0, tokens * (self.days["confirmed"] + self.days["unconfirmed"] - 1))
+        return {"confirmed": confirmed, "unconfirmed": total - confirmed}
+
+    def add(self, usage: dict) -> dict:
+        """Counts one batch call's usage and returns the increase per source."""
+        batched = usage.get("batched_days")
+        if not self.preamble_tokens or not batched:
+            return {}
+        evaluated = usage.get("prompt_eval_count")
+        if evaluated is not None and evaluated >= self.preamble_tokens:
+            return {}
+        before = self.totals()
+        self.days["unconfirmed" if evaluated is None else "confirmed"] += batched
+        after = self.totals()
+        return {source: after[source] - before[source] for source in after if after[source] > before[source]}
 
-        day_obj["activities"] = acts
-        structured_days.append(day_obj)
 
-    overview = f"{request.days}-day trip to {request.destination} for {request.travelers} traveler(s). Budget: {request.budget}. Interests: {interests}."
+async def iter_itinerary_days(request: TravelRequest, destination_info: dict,
+                             on_progress: Optional[Callable[[int, str], None]] = None,
+                             stats: Optional[dict] = None, completed: Optional[dict] = None):
+    """
+    Fans out day generation (at most ITINERARY_DAY_CONCURRENCY calls at once)
+    and yields normalized days in day order as soon as each one is ready.
+    With ITINERARY_BATCH_SIZE > 1 each call covers several days.
+    on_progress(day_num, text) is called for every streamed token fragment;
+    stats, if given, is filled with batching/prefill figures for the plan.
+    completed maps day numbers to already normalized days that are reused.
+    """
+    attractions_list = destination_info.get("attractions", [])
+    themes = [BASE_THEMES[i % len(BASE_THEMES)] for i in range(request.days)]
+    # An admitted request runs no more generations at once than it was granted
+    semaphore = asyncio.Semaphore(max(1, _request_fanout.get() or ITINERARY_DAY_CONCURRENCY))
+    batch_size = max(1, ITINERARY_BATCH_SIZE)
+    completed = completed or {}
+    day_nums = [d for d in range(1, request.days + 1) if d not in completed]
+    batches = [day_nums[i:i + batch_size] for i in range(0, len(day_nums), batch_size)]
+
+    preamble, context, preamble_tokens = None, None, None
+    if batch_size > 1:
+        preamble = _build_trip_preamble(request)
+        # A single call evaluates the preamble once anyway; a prefill would
+        # only add a round-trip and a scheduler slot
+        if len(batches) > 1:
+            try:
+                context, preamble_tokens = await _ollama_prefill(preamble, seed=1000, route_key=preamble)
+            except Exception:
+                # Without a context every batch resends the preamble itself
+                print(traceback.format_exc())
+
+    if stats is not None:
+        stats.update({
+            "batch_size": batch_size,
+            "llm_batches": len(batches),
+            "context_reused": bool(context),
+            "prefill_tokens_saved": 0,
+            "prefill_tokens_saved_unconfirmed": 0,
+        })
+
+    savings = PrefillSavings(preamble_tokens if context else None)
+
+    def count_saved(usage: dict):
+        for source, amount in savings.add(usage).items():
+            PREFILL_TOKENS_SAVED.inc(source, amount=amount)
+        if stats is not None:
+            totals = savings.totals()
+            stats["prefill_tokens_saved"] = totals["confirmed"]
+            stats["prefill_tokens_saved_unconfirmed"] = totals["unconfirmed"]
+
+    async def bounded(batch: List[int]):
+        async with semaphore:
+            if batch_size == 1:
+                day_num = batch[0]
+                return {day_num: await _generate_day(request, day_num, themes[day_num - 1], attractions_list, on_progress)}
+            usage = {}
+            days = await _generate_batch(request, batch, themes, attractions_list, preamble, context, on_progress, usage)
+            count_saved(usage)
+            return days
+
+    tasks = [asyncio.ensure_future(bounded(batch)) for batch in batches]
+    task_for_day = {day_num: task for batch, task in zip(batches, tasks) for day_num in batch}
+    used_titles = set()
+    try:
+        for day_num in range(1, request.days + 1):
+            if day_num in completed:
+                day_obj = completed[day_num]
+                used_titles.update(a.get("title", "").lower() for a in day_obj.get("activities", []))
+                yield day_obj
+                continue
+            days = await task_for_day[day_num]
+            yield _normalize_day(days[day_num], day_num, themes[day_num - 1], used_titles)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def generate_itinerary_with_ollama(request: TravelRequest, destination_info: dict):
+    """
+    Generates itinerary day-by-day to reduce repetition and improve structure.
+    Days are generated concurrently and merged in order.
+    Returns: { "text": "...", "structured": [...], "generation": {...} }
+    """
+    stats = {}
+    structured_days = [day async for day in iter_itinerary_days(request, destination_info, stats=stats)]
 
     return {
-        "text": overview,
-        "structured": structured_days
+        "text": _trip_overview(request),
+        "structured": structured_days,
+        "generation": stats
     }
 
 
+def _trip_overview(request: TravelRequest) -> str:
+    interests = _trip_interests(request)
+    return f"{request.days}-day trip to {request.destination} for {request.travelers} traveler(s). Budget: {request.budget}. Interests: {interests}."
+
+
 def calculate_cost(days: int, budget: str, travelers: int):
     daily_rates = {"budget": 50, "midrange": 150, "luxury": 400}
     daily = daily_rates.get(budget, 150)
@@ -0,0 +1,161 @@
+"""
+Minimal Prometheus text-format metrics.
+
+Counters and histograms are plain dicts keyed by label values, so recording
+costs a few dict operations and is cheap enough to leave on in production.
+Values owned by other components (cache, scheduler) are read through
+callback gauges at scrape time.
+"""
+import bisect
+import math
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _fmt(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in sorted(self._values.items()):
+            yield f"{self.name}{_label_str(self.label_names, values)} {_fmt(total)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            series[idx] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.label_names + ("le",)
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield f"{self.name}_bucket{_label_str(names, values + (_fmt(float(bound)),))} {cumulative}"
+            yield f"{self.name}_bucket{_label_str(names, values + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_label_str(self.label_names, values)} {_fmt(float(series[-2]))}"
+            yield f"{self.name}_count{_label_str(self.label_names, values)} {series[-1]}"
+
+
+class CallbackGauge:
+    """Gauge (or counter) whose samples come from fn() at scrape time."""
+
+    def __init__(self, name: str, help: str, fn, labels=(), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        samples = self.fn()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for values, value in sorted(samples.items()):
+            yield f"{self.name}{_label_str(self.label_names, values)} {_fmt(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, fn, labels=(), kind: str = "gauge") -> CallbackGauge:
+        return self._add(CallbackGauge(name, help, fn, labels, kind))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count and duration per endpoint.
+    Duration covers the whole response, including streamed bodies.
+    """
+
+    def __init__(self, app, requests_total: Counter, request_duration: Histogram, clock):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_duration = request_duration
+        self.clock = clock
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = self.clock()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched endpoint in the (shared) scope
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", "unmatched")
+            self.request_duration.observe(self.clock() - started, name)
+            self.requests_total.inc(name, str(status["code"]))
@@ -0,0 +1,293 @@
+"""
+Async client for a pool of Ollama servers.
+
+Each backend has its own pooled httpx.AsyncClient, so LLM calls never block
+the event loop and keep-alive connections are reused between generations.
+Calls go to the backend with the fewest outstanding requests; calls with a
+route key (e.g. seeded generations) prefer the same backend every time, so
+its prompt cache stays warm and outputs stay reproducible. Backends that
+keep failing are ejected, probed in the background and readmitted once
+they answer again; a failed call is retried on the next backend.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from contextlib import aclosing
+
+import httpx
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Comma-separated backend pool; defaults to the single OLLAMA_URL
+OLLAMA_URLS = [u.strip() for u in (os.getenv("OLLAMA_URLS") or OLLAMA_URL).split(",") if u.strip()]
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "8"))
+OLLAMA_HEALTH_INTERVAL_SECONDS = float(os.getenv("OLLAMA_HEALTH_INTERVAL_SECONDS", "5"))
+# Consecutive failed calls before a backend is ejected, and for how long
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "3"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "15"))
+# A sticky backend is skipped while it carries more than this multiple of the
+# pool's average outstanding requests (consistent hashing with bounded loads)
+OLLAMA_STICKY_LOAD_FACTOR = float(os.getenv("OLLAMA_STICKY_LOAD_FACTOR", "1.5"))
+# ...but never while it has fewer outstanding requests than this
+OLLAMA_STICKY_MIN_OUTSTANDING = int(os.getenv("OLLAMA_STICKY_MIN_OUTSTANDING", "4"))
+
+
+class OllamaError(Exception):
+    def __init__(self, message: str, retryable: bool = False, backend_fault: bool = None):
+        super().__init__(message)
+        # True when another backend may well succeed (connection refused, 5xx)
+        self.retryable = retryable
+        # True when the error counts towards ejecting the backend; a backend
+        # that hangs is at fault even though another would be as slow
+        self.backend_fault = retryable if backend_fault is None else backend_fault
+
+
+def _transport_error(e: httpx.HTTPError) -> OllamaError:
+    if isinstance(e, httpx.TimeoutException):
+        # Connect timeouts mean the backend is unreachable; read timeouts mean
+        # a slow generation, which would only be slow again elsewhere
+        return OllamaError(f"Ollama request timed out: {e!r}", retryable=isinstance(e, httpx.ConnectTimeout),
+                           backend_fault=True)
+    return OllamaError(f"Ollama request failed: {e!r}", retryable=True)
+
+
+def _status_error(status_code: int, body: str) -> OllamaError:
+    return OllamaError(f"Ollama HTTP {status_code}: {body[:400]}", retryable=status_code >= 500)
+
+
+class Backend:
+    def __init__(self, url: str, timeout: float, limits: httpx.Limits):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._limits = limits
+        self._client = None
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0          # consecutive failed calls
+        self.ejected_until = 0.0
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0, "readmissions": 0}
+
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={"Content-Type": "application/json"},
+                limits=self._limits,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+            )
+        return self._client
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def record(self, ok: bool):
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        self.stats["failures"] += 1
+        if self.healthy and self.failures >= OLLAMA_EJECT_AFTER_FAILURES:
+            self.eject()
+
+    def eject(self):
+        self.healthy = False
+        self.ejected_until = time.monotonic() + OLLAMA_EJECT_SECONDS
+        self.stats["ejections"] += 1
+        print(f"Ollama backend ejected: {self.url}")
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.failures,
+            **self.stats,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        urls=None,
+        timeout: float = OLLAMA_TIMEOUT_SECONDS,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive: int = OLLAMA_MAX_KEEPALIVE,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL_SECONDS,
+    ):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.backends = [Backend(url, timeout, limits) for url in (urls or OLLAMA_URLS)]
+        self.health_interval = health_interval
+        self._health_task = None
+        # Called with the number of healthy backends whenever it changes
+        self.on_health_change = None
+        self._healthy_count = len(self.backends)
+
+    def healthy_count(self) -> int:
+        return sum(1 for b in self.backends if b.healthy)
+
+    def _notify_health(self):
+        count = self.healthy_count()
+        if count != self._healthy_count:
+            self._healthy_count = count
+            if self.on_health_change is not None:
+                self.on_health_change(count)
+
+    async def start(self):
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._probe(b) for b in self.backends))
+            self._notify_health()
+
+    async def _probe(self, backend: Backend):
+        try:
+            r = await backend.client().get("/api/tags", timeout=httpx.Timeout(2.0))
+            ok = r.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+
+        if not ok:
+            if backend.healthy:
+                backend.eject()
+            return
+        if not backend.healthy and time.monotonic() >= backend.ejected_until:
+            backend.healthy = True
+            backend.failures = 0
+            backend.stats["readmissions"] += 1
+            print(f"Ollama backend readmitted: {backend.url}")
+
+    def _pick(self, route_key: str = None, exclude=()) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not candidates:
+            # Nothing known-good left: trying a suspect backend beats failing outright
+            candidates = sorted((b for b in self.backends if b not in exclude), key=lambda b: b.failures)[:1]
+        if route_key is None or len(candidates) == 1:
+            return min(candidates, key=lambda b: (b.outstanding, b.stats["requests"]))
+
+        # Rendezvous hashing: each key ranks backends the same way every time,
+        # and only keys of a removed backend move elsewhere
+        ranked = sorted(
+            candidates,
+            key=lambda b: hashlib.sha1(f"{b.url}|{route_key}".encode("utf-8")).digest(),
+        )
+        total = sum(b.outstanding for b in candidates) + 1
+        cap = max(OLLAMA_STICKY_MIN_OUTSTANDING, math.ceil(OLLAMA_STICKY_LOAD_FACTOR * total / len(candidates)))
+        for backend in ranked:
+            if backend.outstanding < cap:
+                return backend
+        return ranked[0]
+
+    def _timeout(self, timeout: float = None) -> dict:
+        if timeout is None:
+            return {}
+        return {"timeout": httpx.Timeout(timeout, connect=5.0)}
+
+    async def _with_failover(self, route_key: str, attempt):
+        """
+        Yields what attempt(backend) (an async generator) yields, moving on to
+        the next backend when an attempt fails with a retryable error before
+        yielding anything, and recording each attempt's outcome.
+        """
+        tried = []
+        while True:
+            backend = self._pick(route_key, tried)
+            tried.append(backend)
+            backend.outstanding += 1
+            backend.stats["requests"] += 1
+            started = False
+            try:
+                try:
+                    async with aclosing(attempt(backend)) as items:
+                        async for item in items:
+                            if not started:
+                                # Answering at all counts as success, even if
+                                # the caller stops reading early
+                                started = True
+                                backend.record(ok=True)
+                            yield item
+                except httpx.HTTPError as e:
+                    raise _transport_error(e) from e
+                except ValueError as e:
+                    # Truncated or garbled JSON: the backend is misbehaving
+                    raise OllamaError(f"Ollama sent invalid JSON: {e}", retryable=True) from e
+            except OllamaError as e:
+                # Errors that say nothing about the backend (a 4xx for a bad
+                # request) leave its failure count as it was
+                if e.backend_fault:
+                    backend.record(ok=False)
+                    self._notify_health()
+                if e.retryable and not started and len(tried) < len(self.backends):
+                    continue
+                raise
+            finally:
+                backend.outstanding -= 1
+            return
+
+    async def generate(self, payload: dict, timeout: float = None, route_key: str = None) -> dict:
+        """
+        POST /api/generate and return the decoded JSON body, failing over to
+        another backend when one is unreachable or errors.
+        Cancelling the awaiting task aborts the HTTP request.
+        """
+        async def attempt(backend: Backend):
+            r = await backend.client().post("/api/generate", json=payload, **self._timeout(timeout))
+            if r.status_code != 200:
+                raise _status_error(r.status_code, r.text)
+            yield r.json()
+
+        async with aclosing(self._with_failover(route_key, attempt)) as results:
+            async for body in results:
+                return body
+
+    async def generate_stream(self, payload: dict, timeout: float = None, route_key: str = None):
+        """
+        POST /api/generate with stream=true and yield each decoded chunk
+        as it arrives. Fails over to another backend only before the first
+        chunk. Closing the generator aborts the HTTP request.
+        """
+        async def attempt(backend: Backend):
+            async with backend.client().stream(
+                "POST", "/api/generate", json={**payload, "stream": True}, **self._timeout(timeout)
+            ) as r:
+                if r.status_code != 200:
+                    body = (await r.aread()).decode("utf-8", "replace")
+                    raise _status_error(r.status_code, body)
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(f"Ollama stream error: {chunk['error']}")
+                    yield chunk
+
+        async with aclosing(self._with_failover(route_key, attempt)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    def snapshot(self) -> list:
+        return [b.snapshot() for b in self.backends]
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for backend in self.backends:
+            await backend.close()
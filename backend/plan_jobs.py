@@ -0,0 +1,198 @@
+"""
+Background plan jobs persisted in SQLite.
+
+POST /plan/jobs stores the request and returns at once; a small pool of
+worker tasks generates the itinerary and saves every finished day, so
+clients can poll progress and a restart resumes from the last saved day.
+An optional idempotency key makes resubmissions return the original job.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+PLAN_JOBS_PATH = os.getenv(
+    "PLAN_JOBS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_jobs.sqlite3"),
+)
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", "2"))
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+class JobDeferred(Exception):
+    """Raised by a runner when the job should be retried after delay seconds."""
+
+    def __init__(self, delay: float):
+        super().__init__(f"Job deferred for {delay}s")
+        self.delay = delay
+
+
+class JobStore:
+    def __init__(self, path: str = PLAN_JOBS_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " idempotency_key TEXT UNIQUE,"
+            " request TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error TEXT,"
+            " result TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_days ("
+            " job_id TEXT NOT NULL,"
+            " day_num INTEGER NOT NULL,"
+            " day TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, day_num));"
+        )
+        self._conn.commit()
+
+    def create(self, request: dict, idempotency_key: str = None):
+        """Returns (job_id, created). Reuses the job already stored for the key."""
+        body = json.dumps(request, sort_keys=True)
+        with self._lock:
+            if idempotency_key:
+                row = self._conn.execute(
+                    "SELECT id, request FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] != body:
+                        raise IdempotencyConflict("Idempotency key already used with a different request")
+                    return row[0], False
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, request, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, idempotency_key or None, body, now, now),
+            )
+            self._conn.commit()
+            return job_id, True
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, request, status, error, result, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            days = self._conn.execute(
+                "SELECT day_num, day FROM job_days WHERE job_id = ? ORDER BY day_num", (job_id,)
+            ).fetchall()
+        return {
+            "job_id": row[0],
+            "request": json.loads(row[1]),
+            "status": row[2],
+            "error": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "created_at": row[5],
+            "updated_at": row[6],
+            "days": {day_num: json.loads(day) for day_num, day in days},
+        }
+
+    def set_status(self, job_id: str, status: str, error: str = None, result: dict = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, result = ?, updated_at = ? WHERE id = ?",
+                (status, error, json.dumps(result) if result is not None else None, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def save_day(self, job_id: str, day_num: int, day: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_days (job_id, day_num, day) VALUES (?, ?, ?)",
+                (job_id, day_num, json.dumps(day)),
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PlanJobQueue:
+    """
+    runner(request, completed_days, save_day) generates the plan, awaiting
+    save_day(day_num, day) for each new day, and returns the final result.
+    """
+
+    def __init__(self, store: JobStore, runner, workers: int = PLAN_JOB_WORKERS):
+        self.store = store
+        self.runner = runner
+        self.workers = max(1, workers)
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    async def start(self):
+        # Jobs interrupted by a restart continue from their saved days
+        for job_id in await asyncio.to_thread(self.store.unfinished):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, request: dict, idempotency_key: str = None):
+        job_id, created = await asyncio.to_thread(self.store.create, request, idempotency_key)
+        if created:
+            self._queue.put_nowait(job_id)
+        return job_id, created
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _requeue_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                continue
+
+            async def save_day(day_num: int, day: dict):
+                await asyncio.to_thread(self.store.save_day, job_id, day_num, day)
+
+            await asyncio.to_thread(self.store.set_status, job_id, "running")
+            try:
+                result = await self.runner(job["request"], job["days"], save_day)
+            except JobDeferred as e:
+                await asyncio.to_thread(self.store.set_status, job_id, "queued")
+                asyncio.ensure_future(self._requeue_later(job_id, e.delay))
+            except asyncio.CancelledError:
+                # Shutting down: left as "running" so the next start resumes it
+                raise
+            except Exception as e:
+                print(traceback.format_exc())
+                await asyncio.to_thread(self.store.set_status, job_id, "failed", str(e))
+            else:
+                await asyncio.to_thread(self.store.set_status, job_id, "done", None, result)
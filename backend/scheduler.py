@@ -0,0 +1,149 @@
+"""
+Admission control and priority scheduling for Ollama generations.
+
+Only max_concurrent generations run at once; the rest wait in a priority
+queue (lower number first, FIFO within a priority). Requests are admitted
+for the number of generations they will run at once, so admitted work never
+needs more than max_concurrent + max_queue slots; less urgent requests can
+be made to leave headroom for urgent ones. New requests are refused when
+nothing fits, and queued work gives up once it has waited longer than its
+deadline. Both cases carry a Retry-After estimate.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+OLLAMA_MAX_CONCURRENT = int(os.getenv("OLLAMA_MAX_CONCURRENT", "4"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "64"))
+
+
+class SchedulerBusy(Exception):
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(SchedulerBusy):
+    status_code = 429
+
+
+class QueueTimeout(SchedulerBusy):
+    status_code = 503
+
+
+class GenerationScheduler:
+    def __init__(self, max_concurrent: int = OLLAMA_MAX_CONCURRENT, max_queue: int = SCHEDULER_MAX_QUEUE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self._active = 0
+        self._queued = 0
+        self._demand = 0  # generations admitted requests may run at once
+        self._waiters = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self._avg_service = 10.0  # EWMA of seconds per generation, for Retry-After
+        self.stats = {"started": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def retry_after(self) -> int:
+        backlog = self._active + self._queued
+        return max(1, math.ceil(self._avg_service * backlog / self.max_concurrent))
+
+    @property
+    def demand(self) -> int:
+        return self._demand
+
+    def admit(self, want: int = 1, headroom: int = 0) -> int:
+        """
+        Admits a request that would like to run want generations at once and
+        returns how many it may run (at least 1, fewer when busy). headroom
+        queue places are left for more urgent requests. Call release() with
+        the returned number once the request has finished.
+        """
+        room = self.max_concurrent + self.max_queue - headroom - self._demand
+        if room < 1:
+            self.stats["rejected"] += 1
+            raise QueueFull("Server busy, too many queued requests", self.retry_after())
+        granted = max(1, min(want, room))
+        self._demand += granted
+        return granted
+
+    def release(self, granted: int):
+        self._demand -= granted
+
+    @asynccontextmanager
+    async def slot(self, priority: int, max_wait: float):
+        await self._acquire(priority, max_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service = 0.8 * self._avg_service + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self, priority: int, max_wait: float):
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            self.stats["started"] += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), fut])
+        self._queued += 1
+        try:
+            # Not wait_for: on Python 3.11 it can swallow our cancellation when
+            # the slot is handed over in the same loop iteration
+            async with asyncio.timeout(max_wait):
+                await fut
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed to us just as we gave up: pass it on
+                self._release()
+            else:
+                fut.cancel()
+                self._queued -= 1
+            if isinstance(e, TimeoutError):
+                self.stats["timed_out"] += 1
+                raise QueueTimeout("Timed out waiting for a free model slot", self.retry_after()) from None
+            # Caller went away (e.g. client disconnected) while queued
+            self.stats["cancelled"] += 1
+            raise
+        self.stats["started"] += 1
+
+    def resize(self, max_concurrent: int):
+        """
+        Changes the number of slots. Extra slots go to waiters at once; when
+        shrinking, running generations finish and their slots are not reused.
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        while self._active < self.max_concurrent and self._hand_over():
+            self._active += 1
+
+    def _release(self):
+        # Hand the slot over directly (_active stays the same) unless over capacity
+        if self._active <= self.max_concurrent and self._hand_over():
+            return
+        self._active -= 1
+
+    def _hand_over(self) -> bool:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue  # waiter already left the queue
+            self._queued -= 1
+            fut.set_result(None)
+            return True
+        return False
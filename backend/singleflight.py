@@ -0,0 +1,56 @@
+"""
+Single-flight coalescing for identical in-flight calls.
+
+Concurrent callers with the same key share one running task instead of each
+starting their own. A caller that is cancelled only stops waiting; the shared
+task is cancelled once no caller is waiting on it any more. Errors raised by
+the task are re-raised to every caller. The task runs in the context of the
+caller that started it, so context variables of later callers do not apply.
+"""
+import asyncio
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self.stats = {"leaders": 0, "followers": 0, "abandoned": 0}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn):
+        """
+        Runs fn() (a coroutine function) for key, or joins the call already
+        running for it, and returns its result.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+
+        call.waiters += 1
+        try:
+            # shield: one caller going away must not cancel the shared call
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+                self.stats["abandoned"] += 1
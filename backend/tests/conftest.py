@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The backend modules are imported flat (from catalog import ...), as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main opens its SQLite stores on import; keep them out of the source tree
+os.environ.setdefault("GENERATION_CACHE_ENABLED", "0")
+os.environ.setdefault("PLAN_JOBS_PATH", os.path.join(tempfile.mkdtemp(), "plan_jobs.sqlite3"))
@@ -0,0 +1,46 @@
+import pytest
+
+from catalog import DestinationCatalog, _typo_distance
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return DestinationCatalog()
+
+
+@pytest.mark.parametrize("query, name", [
+    ("paris", "Paris"),
+    ("Tokyo, Japan", "Tokyo"),
+    ("barcel", "Barcelona"),
+    ("Marakech", "Marrakech"),
+    ("lisbn", "Lisbon"),
+    ("kyotto", "Kyoto"),
+    ("Florance", "Florence"),
+    ("Mexico city, MX", "Mexico City"),
+    ("Kyoto, JP", "Kyoto"),
+    ("lisbn, Portugal", "Lisbon"),
+    ("Paris,", "Paris"),
+])
+def test_lookup_resolves_typos_and_variants(catalog, query, name):
+    assert catalog.lookup(query).name == name
+
+
+@pytest.mark.parametrize("query", [
+    "Parma", "Perth", "Grenada", "Bern", "Cairo", "nowhere land", "",
+    "Lagos, Nigeria", "Granada, Nicaragua", "Paris, Texas", "Naples, Florida",
+])
+def test_lookup_does_not_substitute_another_place(catalog, query):
+    assert catalog.lookup(query) is None
+
+
+def test_typo_distance_prices_substitutions_higher():
+    assert _typo_distance("lisbn", "lisbon") == 1
+    assert _typo_distance("kyoot", "kyoto") == 1
+    assert _typo_distance("parma", "paris") == 4
+    assert _typo_distance("grenada", "granada") == 2
+
+
+def test_places_in_filters_by_interest_tags(catalog):
+    food = catalog.places_in("Japan", {"food"})
+    assert food and all("food" in p.tags for p in food)
+    assert len(catalog.places_in("France", set())) > len(catalog.places_in("France", {"nightlife"}))
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import gen_cache
+from gen_cache import GenerationCache, _DiskStore
+
+
+def test_disk_tier_is_trimmed_to_max_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen_cache, "DISK_PURGE_EVERY", 10)
+    store = _DiskStore(str(tmp_path / "cache.sqlite3"), max_age=3600, max_rows=25)
+    for i in range(100):
+        store.put(f"k{i}", "m", f"r{i}")
+    assert store.count() <= 25 + 10
+    # The newest rows are kept
+    assert store.get("k99") == ("m", "r99")
+    assert store.get("k0") is None
+    store.close()
+
+
+def test_expired_rows_are_deleted_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    store = _DiskStore(path, max_age=3600, max_rows=100)
+    store.put("old", "m", "r")
+    store._conn.execute("UPDATE generations SET created_at = ?", (time.time() - 7200,))
+    store._conn.commit()
+    store.close()
+
+    store = _DiskStore(path, max_age=3600, max_rows=100)
+    assert store.count() == 0
+    store.close()
+
+
+def test_disk_hit_after_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def main():
+        cache = GenerationCache(path=path)
+        await cache.put("k", "m", "response")
+        cache.close()
+        cache = GenerationCache(path=path)
+        try:
+            return await cache.get("k"), cache.stats["disk_hits"]
+        finally:
+            cache.close()
+
+    assert asyncio.run(main()) == ("response", 1)
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from json_stream import JsonObjectScanner
+
+OBJECT = '{"a": "brace } and quote \\" inside", "b": {"c": [1, {"d": "\\\\"}]}}'
+
+
+def feed_all(chunks):
+    scanner = JsonObjectScanner()
+    for chunk in chunks:
+        if scanner.feed(chunk) is not None:
+            break
+    return scanner
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(OBJECT)])
+def test_object_found_across_any_chunking(size):
+    text = "Sure! Here it is: " + OBJECT + "\nHope this helps {"
+    scanner = feed_all([text[i:i + size] for i in range(0, len(text), size)])
+    assert scanner.done
+    assert json.loads(scanner.result) == json.loads(OBJECT)
+
+
+def test_escape_split_across_chunks():
+    scanner = feed_all(['{"a": "x\\', '"}', '"}'])
+    assert scanner.result == '{"a": "x\\"}"}'
+
+
+def test_incomplete_object_is_not_done():
+    scanner = feed_all(["no json yet ", '{"a": {"b": 1}'])
+    assert scanner.started and not scanner.done
+    assert JsonObjectScanner().feed("plain text") is None
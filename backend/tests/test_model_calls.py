@@ -0,0 +1,25 @@
+import asyncio
+
+import main
+
+
+def test_coalesced_calls_share_only_within_a_request_class(monkeypatch):
+    fetched = []
+
+    async def fake_fetch(payload, key, timeout=None, on_chunk=None, route_key=None, usage=None):
+        fetched.append(main._request_class.get())
+        await asyncio.sleep(0.05)
+        return "{}"
+
+    monkeypatch.setattr(main, "_ollama_fetch", fake_fetch)
+
+    async def call(request_class):
+        main._request_class.set(request_class)
+        return await main._ollama_generate("same prompt", seed=1)
+
+    async def run():
+        await asyncio.gather(call("job"), call("plan"), call("plan"))
+
+    asyncio.run(run())
+    # The plans share a call queued as a plan, not the job's low-priority one
+    assert sorted(fetched) == ["job", "plan"]
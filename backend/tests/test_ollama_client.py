@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ollama_client import OllamaClient, OllamaError
+
+
+def make_client(handlers):
+    """One backend per handler, each served by an httpx.MockTransport."""
+    client = OllamaClient(urls=[f"http://backend-{i}" for i in range(len(handlers))], health_interval=0)
+    for backend, handler in zip(client.backends, handlers):
+        backend._client = httpx.AsyncClient(base_url=backend.url, transport=httpx.MockTransport(handler))
+    return client
+
+
+def ok(request):
+    return httpx.Response(200, json={"response": "{}", "done": True})
+
+
+def down(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def garbled(request):
+    return httpx.Response(200, content=b'{"response": "x", "do\n')
+
+
+def test_generate_fails_over_and_ejects_after_repeated_failures():
+    async def main():
+        client = make_client([down, ok])
+        changes = []
+        client.on_health_change = changes.append
+        client.backends[1].outstanding = 100  # least loaded: the broken backend is tried first
+        for _ in range(3):
+            assert await client.generate({"prompt": "p"}) == {"response": "{}", "done": True}
+        await client.close()
+        return client.backends, changes
+
+    (broken, working), changes = asyncio.run(main())
+    assert changes == [1]
+    assert not broken.healthy and broken.stats["ejections"] == 1
+    assert working.stats["requests"] == 3 and working.outstanding == 100
+    assert broken.outstanding == 0
+
+
+def test_malformed_stream_line_is_an_ollama_error_and_fails_over():
+    async def main():
+        client = make_client([garbled, ok])
+        client.backends[1].outstanding = 100  # prefer the garbled backend
+        chunks = [c async for c in client.generate_stream({"prompt": "p"})]
+        await client.close()
+        return chunks, client.backends[0].stats["failures"]
+
+    chunks, failures = asyncio.run(main())
+    assert chunks == [{"response": "{}", "done": True}]
+    assert failures == 1
+
+
+def test_non_retryable_errors_do_not_fail_over():
+    async def main():
+        client = make_client([lambda r: httpx.Response(400, text="bad request"), ok])
+        client.backends[1].outstanding = 100
+        try:
+            with pytest.raises(OllamaError):
+                await client.generate({"prompt": "p"})
+        finally:
+            await client.close()
+        return [b.stats["requests"] for b in client.backends]
+
+    assert asyncio.run(main()) == [1, 0]
+
+
+def test_read_timeouts_eject_without_failing_over():
+    def hangs(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def main():
+        client = make_client([hangs, ok])
+        client.backends[1].outstanding = 100
+        try:
+            for _ in range(3):
+                with pytest.raises(OllamaError):
+                    await client.generate({"prompt": "p"})
+        finally:
+            await client.close()
+        return client.backends
+
+    hanging, other = asyncio.run(main())
+    assert hanging.stats["requests"] == 3 and other.stats["requests"] == 0
+    assert not hanging.healthy and hanging.stats["ejections"] == 1
+
+
+def test_client_errors_leave_the_failure_count_unchanged():
+    async def main():
+        client = make_client([lambda r: httpx.Response(400, text="bad request")])
+        client.backends[0].failures = 2
+        try:
+            with pytest.raises(OllamaError):
+                await client.generate({"prompt": "p"})
+        finally:
+            await client.close()
+        return client.backends[0]
+
+    backend = asyncio.run(main())
+    assert backend.failures == 2 and backend.healthy
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from plan_jobs import IdempotencyConflict, JobDeferred, JobStore, PlanJobQueue
+
+REQUEST = {"destination": "Lisbon", "days": 3}
+
+
+async def wait_for_status(queue, job_id, status, timeout=2.0):
+    async with asyncio.timeout(timeout):
+        while True:
+            job = await queue.get(job_id)
+            if job["status"] == status:
+                return job
+            await asyncio.sleep(0.01)
+
+
+def test_same_idempotency_key_returns_the_same_job(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id, created = store.create(REQUEST, "key-1")
+    assert created
+    # Key order does not matter, the body is compared canonically
+    assert store.create({"days": 3, "destination": "Lisbon"}, "key-1") == (job_id, False)
+    assert store.create(REQUEST)[0] != job_id
+    store.close()
+
+
+def test_idempotency_key_with_a_different_body_conflicts(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    store.create(REQUEST, "key-1")
+    with pytest.raises(IdempotencyConflict):
+        store.create({**REQUEST, "days": 4}, "key-1")
+    store.close()
+
+
+def test_running_job_resumes_from_saved_days(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # A previous process died mid-job after saving day 1
+    store = JobStore(path)
+    job_id, _ = store.create(REQUEST)
+    store.set_status(job_id, "running")
+    store.save_day(job_id, 1, {"day": 1, "title": "Alfama"})
+    store.close()
+
+    seen = []
+
+    async def runner(request, completed, save_day):
+        seen.append(dict(completed))
+        for day_num in range(len(completed) + 1, request["days"] + 1):
+            await save_day(day_num, {"day": day_num})
+        return {"days": request["days"]}
+
+    async def main():
+        queue = PlanJobQueue(JobStore(path), runner, workers=1)
+        await queue.start()
+        try:
+            return await wait_for_status(queue, job_id, "done")
+        finally:
+            await queue.stop()
+            queue.store.close()
+
+    job = asyncio.run(main())
+    assert seen == [{1: {"day": 1, "title": "Alfama"}}]
+    assert sorted(job["days"]) == [1, 2, 3]
+    assert job["result"] == {"days": 3}
+
+
+def test_deferred_job_is_requeued(tmp_path):
+    calls = []
+
+    async def runner(request, completed, save_day):
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) == 1:
+            raise JobDeferred(0.05)
+        return {"ok": True}
+
+    async def main():
+        queue = PlanJobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), runner, workers=1)
+        await queue.start()
+        try:
+            job_id, _ = await queue.submit(REQUEST)
+            return await wait_for_status(queue, job_id, "done")
+        finally:
+            await queue.stop()
+            queue.store.close()
+
+    job = asyncio.run(main())
+    assert job["result"] == {"ok": True}
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.05
@@ -0,0 +1,67 @@
+import asyncio
+
+import main
+from main import PrefillSavings, TravelRequest
+
+
+def test_reused_context_counts_confirmed_savings():
+    savings = PrefillSavings(100)
+    assert savings.add({"batched_days": 2, "prompt_eval_count": 30}) == {"confirmed": 100}
+    assert savings.add({"batched_days": 2, "prompt_eval_count": 30}) == {"confirmed": 200}
+    assert savings.totals() == {"confirmed": 300, "unconfirmed": 0}
+
+
+def test_reevaluated_preamble_saves_nothing():
+    savings = PrefillSavings(100)
+    assert savings.add({"batched_days": 2, "prompt_eval_count": 130}) == {}
+    assert savings.totals() == {"confirmed": 0, "unconfirmed": 0}
+
+
+def test_calls_without_token_counts_are_unconfirmed():
+    savings = PrefillSavings(100)
+    assert savings.add({"batched_days": 2}) == {"unconfirmed": 100}
+    assert savings.add({"batched_days": 2, "prompt_eval_count": 30}) == {"confirmed": 100, "unconfirmed": 100}
+    assert savings.totals() == {"confirmed": 100, "unconfirmed": 200}
+
+
+def test_fallback_days_and_missing_prefill_save_nothing():
+    savings = PrefillSavings(100)
+    # A malformed batch whose days were all generated one by one
+    assert savings.add({"batched_days": 0}) == {}
+    assert savings.add({"batched_days": 1, "prompt_eval_count": 30}) == {}
+    assert savings.totals() == {"confirmed": 0, "unconfirmed": 0}
+    assert PrefillSavings(None).add({"batched_days": 2, "prompt_eval_count": 30}) == {}
+
+
+def test_resumed_job_counts_only_the_days_it_generates(monkeypatch):
+    monkeypatch.setattr(main, "ITINERARY_BATCH_SIZE", 2)
+    monkeypatch.setattr(main, "OLLAMA_EARLY_STOP", False)
+
+    async def fake_prefill(prompt, seed, route_key=None):
+        return [1, 2, 3], 100
+
+    async def fake_generate(prompt, seed, timeout=None, on_chunk=None, context=None, num_predict=450,
+                            route_key=None, usage=None):
+        if usage is not None:
+            usage["prompt_eval_count"] = 30
+        if "Days 3-4" in prompt:
+            return '{"days": [{"title": "three"}, {"title": "four"}]}'
+        if "Days 5-6" in prompt:
+            return "not json"  # falls back to one call per day
+        return '{"activities": []}'
+
+    monkeypatch.setattr(main, "_ollama_prefill", fake_prefill)
+    monkeypatch.setattr(main, "_ollama_generate", fake_generate)
+
+    completed = {1: {"day": 1, "activities": []}, 2: {"day": 2, "activities": []}}
+    stats = {}
+
+    async def plan():
+        request = TravelRequest(destination="Lisbon", days=6)
+        return [day async for day in main.iter_itinerary_days(request, {}, stats=stats, completed=completed)]
+
+    days = asyncio.run(plan())
+    assert [day["day"] for day in days] == [1, 2, 3, 4, 5, 6]
+    # Days 3-4 came from the context; the prefill cost one preamble
+    assert stats["prefill_tokens_saved"] == 100
+    assert stats["prefill_tokens_saved_unconfirmed"] == 0
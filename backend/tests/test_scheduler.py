@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from scheduler import GenerationScheduler, QueueFull, QueueTimeout
+
+
+def test_admit_grants_fanout_within_capacity():
+    scheduler = GenerationScheduler(max_concurrent=1, max_queue=2)
+    assert scheduler.admit(4, headroom=1) == 2
+    # Plans are refused once only the headroom is left...
+    with pytest.raises(QueueFull):
+        scheduler.admit(1, headroom=1)
+    # ...which suggestions can still use
+    assert scheduler.admit(1) == 1
+    with pytest.raises(QueueFull):
+        scheduler.admit(1)
+
+    scheduler.release(2)
+    scheduler.release(1)
+    assert scheduler.demand == 0
+    assert scheduler.admit(1, headroom=1) == 1
+
+
+def test_lower_priority_number_runs_first():
+    async def main():
+        scheduler = GenerationScheduler(max_concurrent=1, max_queue=8)
+        order = []
+
+        async def job(name, priority):
+            async with scheduler.slot(priority, max_wait=5):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.ensure_future(job("first", 10))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(job("plan", 10)), asyncio.ensure_future(job("suggest", 0))]
+        await asyncio.gather(first, *tasks)
+        return order
+
+    assert asyncio.run(main()) == ["first", "suggest", "plan"]
+
+
+def test_cancel_during_handover_does_not_run_or_leak_slot():
+    async def main():
+        scheduler = GenerationScheduler(max_concurrent=1, max_queue=8)
+        ran = []
+
+        async def waiter():
+            async with scheduler.slot(10, max_wait=5):
+                ran.append(True)
+
+        cm = scheduler.slot(10, max_wait=5)
+        await cm.__aenter__()
+        task = asyncio.ensure_future(waiter())
+        await asyncio.sleep(0)
+        assert scheduler.queued == 1
+
+        # Hand the slot to the waiter and cancel it in the same iteration
+        await cm.__aexit__(None, None, None)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return ran, scheduler.active, scheduler.queued
+
+    assert asyncio.run(main()) == ([], 0, 0)
+
+
+def test_queue_deadline_raises_queue_timeout():
+    async def main():
+        scheduler = GenerationScheduler(max_concurrent=1, max_queue=8)
+        async with scheduler.slot(10, max_wait=5):
+            with pytest.raises(QueueTimeout):
+                async with scheduler.slot(10, max_wait=0.01):
+                    pass
+        return scheduler.active, scheduler.queued, scheduler.stats["timed_out"]
+
+    assert asyncio.run(main()) == (0, 0, 1)
+
+
+def test_resize_follows_capacity():
+    async def main():
+        scheduler = GenerationScheduler(max_concurrent=2, max_queue=8)
+        started = []
+        gate = asyncio.Event()
+
+        async def job(i):
+            async with scheduler.slot(10, max_wait=5):
+                started.append(i)
+                await gate.wait()
+
+        tasks = [asyncio.ensure_future(job(i)) for i in range(4)]
+        await asyncio.sleep(0)
+        assert (scheduler.active, scheduler.queued) == (2, 2)
+
+        scheduler.resize(1)
+        scheduler.resize(3)
+        await asyncio.sleep(0)
+        assert (scheduler.active, scheduler.queued) == (3, 1)
+
+        scheduler.resize(1)
+        gate.set()
+        await asyncio.gather(*tasks)
+        return scheduler.active, len(started)
+
+    assert asyncio.run(main()) == (0, 4)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+        return results, calls, flight.stats, flight.in_flight()
+
+    results, calls, stats, in_flight = asyncio.run(main())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert stats == {"leaders": 1, "followers": 4, "abandoned": 0}
+    assert in_flight == 0
+
+
+def test_errors_reach_every_caller():
+    async def main():
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flight.do("k", fn) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_shared_call_survives_one_caller_and_stops_when_all_leave():
+    async def main():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fn():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.ensure_future(flight.do("k", fn))
+        second = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set() and flight.in_flight() == 1
+
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight.stats["abandoned"], flight.in_flight()
+
+    assert asyncio.run(main()) == (1, 0)